@@ -96,3 +96,9 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         raise HTTPException(status_code=401, detail="User not found")
     
     return user
+
+def get_current_admin(user: User = Depends(get_current_user)):
+    """Catalog-wide maintenance endpoints (discount recompute, archiving, feed rebuilds) are admin-only."""
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
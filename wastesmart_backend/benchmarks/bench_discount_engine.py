@@ -0,0 +1,39 @@
+"""Benchmark: whole-catalog expiry discount recompute (NumPy + bulk upsert) on SQLite.
+
+Run from wastesmart_backend/:  python -m benchmarks.bench_discount_engine [rows]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Product
+from crud.expiry_tracking import recompute_discounts
+
+def seed(engine, n: int):
+    now = datetime.now()
+    batch = 50_000
+    with engine.begin() as conn:
+        for start in range(0, n, batch):
+            conn.execute(insert(Product), [
+                dict(name=f"p{i}", description=None, price=5.0, quantity=1, expiry_date=now + timedelta(hours=i % (24 * 30)),
+                     created_at=now, vendor_id=None, charity_eligible=False, version_id=1, updated_at=now, change_seq=i + 1)
+                for i in range(start, min(start + batch, n))
+            ])
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    seed(engine, n)
+    print(f"seeded {n} products in {time.perf_counter() - start:.1f} s")
+
+    db = sessionmaker(bind=engine)()
+    now = datetime.now()
+    print("first run (every row inserted):", recompute_discounts(db, now=now, notify=False))
+    print("steady state (nothing changed):", recompute_discounts(db, now=now, notify=False))
+    print("one day later (some steps crossed):", recompute_discounts(db, now=now + timedelta(days=1), notify=False))
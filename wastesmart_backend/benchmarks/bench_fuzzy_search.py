@@ -0,0 +1,64 @@
+"""Benchmark: fuzzy product-name search at 100k+ names.
+
+In-memory TrigramIndex (the SQLite/test backend) vs. a brute-force scan scoring every name, and,
+when BENCH_POSTGRES_URL points at a database with the products schema, the pg_trgm backend.
+
+Run from wastesmart_backend/:  python -m benchmarks.bench_fuzzy_search [rows]
+"""
+import os
+import random
+import sys
+import time
+
+from search_index import TrigramIndex, trigrams
+
+WORDS = ["greek", "yogurt", "broccoli", "organic", "sourdough", "bread", "cheddar", "spinach", "salmon",
+         "banana", "avocado", "tomato", "basil", "butter", "chicken", "mozzarella", "croissant", "blueberry"]
+QUERIES = ["yoghurt", "brocolli", "sourdugh bread", "mozarella"]
+THRESHOLD = 0.5
+
+def make_names(n: int):
+    rng = random.Random(42)
+    return [f"{' '.join(rng.sample(WORDS, 2))} {rng.randint(1, 10**6)}" for _ in range(n)]
+
+def brute_force(names, q: str):
+    query = trigrams(q)
+    scored = ((len(query & trigrams(name)) / len(query), i) for i, name in enumerate(names))
+    return sorted((s for s in scored if s[0] >= THRESHOLD), reverse=True)
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def bench_postgres(url: str, n: int):
+    """Times fuzzy_search_products against a live Postgres that already holds `n`-ish products."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from crud.products import fuzzy_search_products
+
+    db = sessionmaker(bind=create_engine(url))()
+    for q in QUERIES:
+        elapsed = best_of(lambda: (fuzzy_search_products(db, q, threshold=THRESHOLD), db.rollback()))
+        print(f"postgres pg_trgm  q={q!r:18}  {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    names = make_names(n)
+
+    start = time.perf_counter()
+    index = TrigramIndex()
+    index.rebuild(enumerate(names))
+    print(f"{n} names  index build: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for q in QUERIES:
+        matches = len(index.search(q, THRESHOLD))
+        indexed = best_of(lambda: index.search(q, THRESHOLD))
+        scan = best_of(lambda: brute_force(names, q), repeat=1)
+        print(f"q={q!r:18} matches: {matches:6}  trigram index: {indexed * 1000:.1f} ms  brute force: {scan * 1000:.0f} ms")
+
+    if os.getenv("BENCH_POSTGRES_URL"):
+        bench_postgres(os.environ["BENCH_POSTGRES_URL"], n)
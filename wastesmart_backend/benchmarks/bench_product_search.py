@@ -0,0 +1,59 @@
+"""Benchmark: FTS5-backed `search_products` vs. the LIKE scan a search would otherwise need (SQLite).
+
+Run from wastesmart_backend/:  python -m benchmarks.bench_product_search [rows]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Product
+from crud.products import search_products
+
+WORDS = ["organic", "fresh", "greek", "yogurt", "milk", "bread", "sourdough", "apple", "banana", "cheddar",
+         "cheese", "spinach", "salad", "chicken", "salmon", "rice", "pasta", "tomato", "basil", "butter"]
+FILLER = [f"word{k}" for k in range(5000)]  # ✅ Long tail, so most terms are selective as in a real catalog
+QUERIES = ["yogurt", "greek yogurt", "sourdough bread", "word4242"]
+
+def seed(engine, n: int):
+    rng = random.Random(42)
+    now = datetime.now()
+    rows = [
+        dict(name=" ".join(rng.sample(WORDS, 2)), description=" ".join(rng.sample(FILLER, 8)), price=1.0 + i % 20,
+             quantity=i % 50, expiry_date=now + timedelta(days=1 + i % 30), created_at=now, vendor_id=None,
+             charity_eligible=False, version_id=1, updated_at=now, change_seq=i + 1)
+        for i in range(n)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Product), rows)  # ✅ FTS5 triggers index every row
+
+def like_scan(db, q: str, limit: int = 50):
+    """What search costs without an index: substring match on every term, sorted by expiry."""
+    query = db.query(Product).filter(Product.expiry_date >= datetime.now())
+    for term in q.split():
+        query = query.filter(or_(Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%")))
+    return query.order_by(Product.expiry_date, Product.id).limit(limit).all()
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    seed(engine, n)
+    db = sessionmaker(bind=engine)()
+
+    for q in QUERIES:
+        fts = best_of(lambda: search_products(db, q))
+        like = best_of(lambda: like_scan(db, q))
+        print(f"{n} rows  q={q!r:20}  fts5: {fts * 1000:.1f} ms  like scan: {like * 1000:.1f} ms")
@@ -0,0 +1,81 @@
+"""Microbenchmark: old per-row dict building + FastAPI re-validation vs. the compiled serializer.
+
+Run from wastesmart_backend/:  python -m benchmarks.bench_product_serialization [rows]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+from typing import Optional
+
+from serializers import ProductOut, dump_json
+
+class ProductResponse(BaseModel):
+    """The response model list routes validated against before `ProductOut`."""
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    quantity: int
+    expiry_date: str
+    created_at: str
+    vendor_id: int
+    charity_eligible: Optional[bool] = None
+
+def make_rows(n: int):
+    """Builds objects with the same attributes as `Product` ORM rows."""
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i, name=f"Product {i}", description="Fresh and near expiry", price=1.5 + i % 20,
+            quantity=i % 50, expiry_date=datetime(2030, 1, 1) + timedelta(days=i % 30),
+            created_at=now, vendor_id=i % 100, charity_eligible=bool(i % 2),
+        )
+        for i in range(n)
+    ]
+
+_response_adapter = TypeAdapter(list[ProductResponse])
+
+def old_path(rows) -> bytes:
+    """What list routes did before: strftime dicts, then FastAPI validation + jsonable_encoder + json.dumps."""
+    dicts = [
+        {
+            "id": p.id,
+            "name": p.name,
+            "description": p.description,
+            "price": p.price,
+            "quantity": p.quantity,
+            "expiry_date": p.expiry_date.strftime("%Y-%m-%d") if p.expiry_date else "N/A",
+            "created_at": p.created_at.strftime("%Y-%m-%d %H:%M:%S") if p.created_at else "N/A",
+            "vendor_id": p.vendor_id,
+            "charity_eligible": p.charity_eligible,
+        }
+        for p in rows
+    ]
+    validated = _response_adapter.validate_python(dicts)
+    content = jsonable_encoder(_response_adapter.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+def new_path(rows) -> bytes:
+    return dump_json(list[ProductOut], rows)
+
+def best_of(fn, rows, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rows = make_rows(n)
+    assert json.loads(old_path(rows)) == json.loads(new_path(rows))  # ✅ Same output
+
+    old = best_of(old_path, rows)
+    new = best_of(new_path, rows)
+    print(f"{n} rows  old: {old * 1000:.1f} ms  new: {new * 1000:.1f} ms  speedup: {old / new:.1f}x")
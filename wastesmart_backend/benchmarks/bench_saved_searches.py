@@ -0,0 +1,56 @@
+"""Benchmark: matching new products against 100k saved searches, indexed vs. checking every search.
+
+Run from wastesmart_backend/:  python -m benchmarks.bench_saved_searches [subscriptions]
+"""
+import random
+import sys
+import time
+
+from search_index import SavedSearchIndex, Subscription, ProductFacts
+
+VOCAB = [f"word{k}" for k in range(2000)] + ["baby", "formula", "milk", "bread", "yogurt", "organic"]
+
+def make_subscriptions(n: int, rng: random.Random):
+    subs = []
+    for i in range(1, n + 1):
+        kind = rng.random()
+        if kind < 0.7:  # keyword searches, some with a price ceiling
+            subs.append(Subscription(i, i, frozenset(rng.sample(VOCAB, rng.randint(1, 2))),
+                                     rng.choice([None, 5.0, 10.0]), None, None, None, None))
+        elif kind < 0.95:  # "anything near me"
+            subs.append(Subscription(i, i, frozenset(), None, rng.choice([None, 30.0]),
+                                     12.5 + rng.random(), 77.0 + rng.random(), rng.choice([2.0, 5.0])))
+        else:  # "anything under a price"
+            subs.append(Subscription(i, i, frozenset(), rng.uniform(0.5, 3.0), None, None, None, None))
+    return subs
+
+def make_products(n: int, rng: random.Random):
+    return [
+        ProductFacts(set(rng.sample(VOCAB, 6)), rng.uniform(1, 20), rng.choice([0.0, 10.0, 40.0]),
+                     12.5 + rng.random(), 77.0 + rng.random())
+        for _ in range(n)
+    ]
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    subs, products = make_subscriptions(n, rng), make_products(1000, rng)
+
+    index = SavedSearchIndex()
+    start = time.perf_counter()
+    for sub in subs:
+        index.add(sub)
+    print(f"{n} saved searches  index build: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    indexed = [len(index.match(p)) for p in products]
+    per_product = (time.perf_counter() - start) / len(products)
+
+    sample = products[:50]
+    start = time.perf_counter()
+    scanned = [sum(1 for s in subs if SavedSearchIndex._matches(s, p)) for p in sample]
+    per_product_scan = (time.perf_counter() - start) / len(sample)
+
+    assert indexed[:len(sample)] == scanned  # ✅ Same matches either way
+    print(f"indexed: {per_product * 1000:.2f} ms/product  full scan: {per_product_scan * 1000:.1f} ms/product  "
+          f"avg matches: {sum(indexed) / len(indexed):.1f}")
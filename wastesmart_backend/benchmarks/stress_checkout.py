@@ -0,0 +1,65 @@
+"""Stress test: parallel checkouts of one product must never sell more than its stock.
+
+Run from wastesmart_backend/:  python -m benchmarks.stress_checkout [checkouts] [stock]
+Uses DATABASE_URL when set (Postgres gives real row-lock contention), otherwise a temporary SQLite file.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Product, Order, User
+from schemas import OrderCreate
+from crud.orders import create_order
+
+def make_engine(workers: int):
+    url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/stress_checkout.db"
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False, "timeout": 60}, pool_size=workers)
+    return create_engine(url, pool_size=workers, max_overflow=0)
+
+if __name__ == "__main__":
+    checkouts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stock = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workers = min(checkouts, 100)
+    engine = make_engine(workers)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        user = User(name="stress", email=f"stress-{time.time_ns()}@example.com", password="x")
+        product = Product(name="flash sale", price=2.5, quantity=stock, expiry_date=datetime.now() + timedelta(days=1))
+        db.add_all([user, product])
+        db.commit()
+        user_id, product_id = user.id, product.id
+
+    start_line = threading.Barrier(workers)
+
+    def checkout(i: int):
+        if i < workers:
+            start_line.wait()  # ✅ Release the first wave together for maximum contention
+        with Session() as db:
+            result = create_order(db, OrderCreate(user_id=user_id, product_id=product_id, quantity=1))
+            return not isinstance(result, dict) and result is not None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sold = sum(pool.map(checkout, range(checkouts)))
+    elapsed = time.perf_counter() - start
+
+    with Session() as db:
+        remaining = db.query(Product.quantity).filter(Product.id == product_id).scalar()
+        ordered = db.query(func.coalesce(func.sum(Order.quantity), 0)).filter(Order.product_id == product_id).scalar()
+
+    print(f"{checkouts} checkouts of {stock} in stock ({engine.dialect.name}, {workers} threads): "
+          f"{sold} sold, {ordered} ordered, {remaining} left in {elapsed:.2f} s")
+    assert sold == ordered == min(stock, checkouts), "oversold or lost orders"
+    assert remaining == stock - sold >= 0, "stock does not match orders"
+    print("OK: no oversell")
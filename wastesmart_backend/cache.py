@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import time
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self._invalidations = 0  # ✅ Bumped by every invalidation; guards against storing stale loads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for `key`, calling `loader()` on a miss. `None` results are not cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._invalidations
+
+        value = loader()  # ✅ Load outside the lock so one slow query doesn't block other readers
+        if value is None:
+            return None
+
+        with self._lock:
+            # ✅ Skip the store if a write invalidated anything while we were loading
+            if generation == self._invalidations:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *keys):
+        """Drops `keys` from the cache."""
+        with self._lock:
+            self._invalidations += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._invalidations += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for tuning size and TTL."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
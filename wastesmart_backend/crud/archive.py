@@ -0,0 +1,91 @@
+from sqlalchemy import select, insert, update, delete, literal, desc, union_all, true, false
+from sqlalchemy.orm import Session
+from models import Product, ProductArchive, ProductTombstone, ExpiryTracking, Order, CharityDonation, next_change_seq
+from crud.products import invalidate_products, DEFAULT_PAGE_SIZE
+from crud.deals import refresh_deals
+from search_index import suggestions, fuzzy_names
+from scheduler import expiry_scheduler
+from datetime import datetime, timezone, timedelta
+import time
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_AFTER_DAYS = 14  # ✅ Expired (or sold out and untouched) for this long
+
+_ARCHIVED_COLUMNS = ("id", "name", "description", "price", "quantity", "expiry_date", "created_at", "vendor_id", "charity_eligible", "category")
+
+def _archivable_ids(db: Session, now: datetime, batch_size: int) -> list[int]:
+    """Next batch to archive: two range scans (expiry_date index, then quantity index) instead of one OR over the table."""
+    cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)  # ✅ Naive local, like expiry_date
+    touched_before = now.astimezone(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)  # ✅ updated_at is UTC
+    expired = db.execute(
+        select(Product.id).where(Product.expiry_date < cutoff).order_by(Product.expiry_date, Product.id).limit(batch_size)
+    ).scalars().all()
+    if len(expired) == batch_size:
+        return expired
+    sold_out = db.execute(
+        select(Product.id)
+        .where(Product.quantity <= 0, Product.updated_at < touched_before, Product.expiry_date >= cutoff)
+        .limit(batch_size - len(expired))
+    ).scalars().all()
+    return expired + sold_out
+
+def _archive_batch(db: Session, product_ids: list[int]):
+    """Moves one batch (products + expiry tracking) to the archive and tombstones it, in one transaction."""
+    archived_at = datetime.now(timezone.utc)  # ✅ Per batch: tombstones must carry their real write time (see _settled_seq)
+    db.execute(insert(ProductArchive).from_select(
+        [*_ARCHIVED_COLUMNS, "discount_percent", "archived_at"],
+        select(*(getattr(Product, c) for c in _ARCHIVED_COLUMNS), ExpiryTracking.discount_percent, literal(archived_at, ProductArchive.archived_at.type))
+        .outerjoin(ExpiryTracking, ExpiryTracking.product_id == Product.id)
+        .where(Product.id.in_(product_ids)),
+    ))
+    db.execute(insert(ProductTombstone).from_select(  # ✅ Delta-sync clients drop them like deletes
+        ["product_id", "vendor_id", "change_seq", "deleted_at"],
+        select(Product.id, Product.vendor_id, next_change_seq(), literal(archived_at, ProductTombstone.deleted_at.type))
+        .where(Product.id.in_(product_ids)),
+    ))
+    for model in (Order, CharityDonation):  # ✅ Keep their FKs valid: point them at the archived row
+        db.execute(update(model).where(model.product_id.in_(product_ids)).values(archived_product_id=model.product_id, product_id=None))
+    db.execute(delete(ExpiryTracking).where(ExpiryTracking.product_id.in_(product_ids)))
+    db.execute(delete(Product).where(Product.id.in_(product_ids)))
+    db.commit()
+
+    invalidate_products(*product_ids)
+    for product_id in product_ids:
+        suggestions.remove("product", product_id)
+        fuzzy_names.remove(product_id)
+        expiry_scheduler.unschedule(product_id)
+
+def archive_products(db: Session, now: datetime | None = None, batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: int | None = None):
+    """Moves expired and sold-out products to products_archive in bounded batches (short transactions, short locks)."""
+    started = time.perf_counter()
+    now = now or datetime.now()
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        product_ids = _archivable_ids(db, now, batch_size)
+        if not product_ids:
+            break
+        _archive_batch(db, product_ids)
+        archived += len(product_ids)
+        batches += 1
+
+    if archived:
+        refresh_deals(db)
+    return {"archived": archived, "batches": batches, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+def get_vendor_history(db: Session, vendor_id: int, limit: int = DEFAULT_PAGE_SIZE, before: int | None = None):
+    """A vendor's live and archived products, newest ID first (keyset pagination on id)."""
+    columns = lambda model: [getattr(model, c) for c in _ARCHIVED_COLUMNS]
+    live = select(*columns(Product), false().label("archived")).where(Product.vendor_id == vendor_id)
+    archived = select(*columns(ProductArchive), true().label("archived")).where(ProductArchive.vendor_id == vendor_id)
+    if before is not None:
+        live, archived = live.where(Product.id < before), archived.where(ProductArchive.id < before)
+    # ✅ Each side is cut to one page before the merge, so the union stays small
+    live, archived = live.order_by(desc(Product.id)).limit(limit + 1), archived.order_by(desc(ProductArchive.id)).limit(limit + 1)
+    history = union_all(live.subquery().select(), archived.subquery().select()).subquery()
+    rows = db.execute(select(history).order_by(desc(history.c.id)).limit(limit + 1)).mappings().all()
+
+    next_before = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before = rows[-1]["id"]
+    return {"items": rows, "next_before": next_before}
@@ -0,0 +1,64 @@
+from sqlalchemy import select, text, func, and_, or_
+from sqlalchemy.orm import Session
+from models import Product, ProductTombstone, expiring_deals, DEALS_QUERY, DEALS_HORIZON_DAYS, still_live
+from crud.products import _encode_cursor, _decode_cursor, DEFAULT_PAGE_SIZE
+from datetime import date, datetime, timedelta
+import os
+import time
+
+DEALS_REFRESH_SECONDS = float(os.getenv("DEALS_REFRESH_SECONDS", "300"))  # ✅ Rebuild at least this often (items age in and out)
+_feed_state = {"change_seq": None, "refreshed_at": 0.0}  # What this worker's last rebuild saw
+
+def _latest_change_seq(db: Session) -> int:
+    """Highest delta-sync position over products and tombstones: it moves on every product write or delete."""
+    return max(
+        db.scalar(select(func.coalesce(func.max(Product.change_seq), 0))),
+        db.scalar(select(func.coalesce(func.max(ProductTombstone.change_seq), 0))),
+    )
+
+def refresh_deals(db: Session):
+    """Rebuilds the expiring_deals feed. On Postgres readers keep seeing the old rows until it finishes."""
+    started = time.perf_counter()
+    change_seq = _latest_change_seq(db)  # ✅ Read first: writes made during the rebuild trigger the next one
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY expiring_deals"))
+    else:
+        # ✅ One transaction: readers see either the old feed or the new one
+        db.execute(text("DELETE FROM expiring_deals"))
+        db.execute(text(f"INSERT INTO expiring_deals {DEALS_QUERY['sqlite']}"))
+    db.commit()
+    _feed_state.update(change_seq=change_seq, refreshed_at=time.monotonic())
+    return {"elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+def refresh_deals_if_stale(db: Session):
+    """Periodic job: rebuilds the feed only if a product was written since the last rebuild, or it is
+    DEALS_REFRESH_SECONDS old. Writers (e.g. bulk repricing) don't rebuild it themselves, so any number
+    of them between two ticks costs one refresh, and none of their requests waits for it."""
+    fresh = time.monotonic() - _feed_state["refreshed_at"] < DEALS_REFRESH_SECONDS
+    if fresh and _feed_state["change_seq"] == _latest_change_seq(db):
+        return None
+    return refresh_deals(db)
+
+def get_deals(db: Session, days: int = DEALS_HORIZON_DAYS, vendor_id: int | None = None,
+              limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+    """Deepest discounts first from the precomputed feed (keyset pagination over (discount_percent, product_id))."""
+    deals = expiring_deals.c
+    query = select(expiring_deals).where(
+        still_live(deals.expiry_date),  # ✅ Drop rows that expired since the last refresh
+        deals.expiry_date < datetime.combine(date.today() + timedelta(days=days + 1), datetime.min.time()),
+    )
+    if vendor_id is not None:
+        query = query.where(deals.vendor_id == vendor_id)
+    if cursor:
+        last_discount, last_id = _decode_cursor(cursor, "deals")
+        query = query.where(or_(
+            deals.discount_percent < last_discount,
+            and_(deals.discount_percent == last_discount, deals.product_id > last_id),
+        ))
+    rows = db.execute(query.order_by(deals.discount_percent.desc(), deals.product_id).limit(limit + 1)).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor("deals", rows[-1]["discount_percent"], rows[-1]["product_id"])
+    return {"items": rows, "next_cursor": next_cursor}
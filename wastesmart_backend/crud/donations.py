@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from models import Donation, CharityDonation, Product
 from schemas import DonationCreate, CharityDonationCreate
+from crud.products import invalidate_products
 from datetime import datetime
 
 # ✅ Handle Monetary Donations
@@ -52,6 +53,7 @@ def create_charity_donation(db: Session, donation: CharityDonationCreate):
 
     db.add(db_donation)
     db.commit()
+    invalidate_products(donation.product_id)  # ✅ Cached stock is now stale
     db.refresh(db_donation)
     return db_donation
 
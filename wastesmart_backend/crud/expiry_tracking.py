@@ -1 +1,168 @@
- 
+from sqlalchemy import select, func, text, true, String, Integer, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import ExpiryTracking, Product, Vendor
+from crud.saved_searches import notify_saved_searches
+from crud.deals import refresh_deals
+from crud.price_history import record_prices
+from discount_policy import DEFAULT_POLICY, get_policy
+from datetime import datetime, timezone
+import numpy as np
+import json
+import time
+
+NOTIFY_BATCH_SIZE = 1000
+SECONDS_PER_DAY = 86400
+
+def _epoch(db: Session, column):
+    """SQL expression for a naive DateTime column as Unix seconds (read as UTC), so it loads as a plain float."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", column)
+    return (func.julianday(column) - 2440587.5) * SECONDS_PER_DAY
+
+def _load_arrays(db: Session, *columns, where=None):
+    """Runs a select and returns each column as a NumPy array (float64, or object for string columns)."""
+    query = select(*columns) if where is None else select(*columns).where(where)
+    result = db.connection().execute(query)
+    rows = result.cursor.fetchall()  # ✅ Raw DBAPI tuples: no Row objects, NumPy converts the whole table in C
+    result.close()
+    dtypes = [object if isinstance(getattr(c, "type", None), String) else np.float64 for c in columns]
+    if not rows:
+        return [np.empty(0, dtype=dtype) for dtype in dtypes]
+    table = np.array(rows, dtype=object if object in dtypes else np.float64)
+    return [table[:, i].astype(dtype) for i, dtype in enumerate(dtypes)]
+
+def _vendor_policies(db: Session) -> dict:
+    """{vendor_id: CompiledPolicy} for the vendors whose policy differs from the default."""
+    policies = {
+        vendor_id: get_policy(vendor_id, version_id, policy_text)
+        for vendor_id, version_id, policy_text in db.connection().execute(
+            select(Vendor.id, Vendor.version_id, Vendor.discount_policy).where(Vendor.discount_policy.is_not(None))
+        )
+    }
+    return {vendor_id: policy for vendor_id, policy in policies.items() if policy is not DEFAULT_POLICY}
+
+def compute_discounts(db: Session, vendor_ids: np.ndarray, days_left: np.ndarray, prices: np.ndarray, categories: np.ndarray) -> np.ndarray:
+    """Discount percent for every product at once: the default policy, then each vendor's own policy on its slice."""
+    discounts = DEFAULT_POLICY.apply(days_left, prices, categories)
+    policies = _vendor_policies(db)
+    if not policies:
+        return discounts
+
+    # ✅ Group products by vendor once, then one vectorized call per vendor with a policy of its own
+    order = np.argsort(vendor_ids, kind="stable")
+    grouped, starts = np.unique(vendor_ids[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    for vendor_id, start, end in zip(grouped.astype(int), starts, ends):
+        policy = policies.get(vendor_id)
+        if policy is not None:
+            rows = order[start:end]
+            discounts[rows] = policy.apply(days_left[rows], prices[rows], categories[rows])
+    return discounts
+
+def _staged_discounts(db: Session, product_ids: np.ndarray, discounts: np.ndarray):
+    """(product_id, discount_percent) pairs as a table bound in a single parameter: unnest() over two arrays on
+    Postgres, json_each() over a JSON array of pairs on SQLite. No per-row parameters to build or send."""
+    product_ids, discounts = product_ids.astype(int).tolist(), discounts.tolist()
+    if db.get_bind().dialect.name == "postgresql":
+        staged = text(
+            "SELECT * FROM unnest(CAST(:product_ids AS integer[]), CAST(:discounts AS float8[])) AS u(product_id, discount_percent)"
+        ).bindparams(product_ids=product_ids, discounts=discounts)
+    else:
+        staged = text(
+            "SELECT json_extract(value, '$[0]') AS product_id, json_extract(value, '$[1]') AS discount_percent FROM json_each(:pairs)"
+        ).bindparams(pairs=json.dumps(list(zip(product_ids, discounts))))
+    return staged.columns(product_id=Integer, discount_percent=Float).subquery("staged")
+
+def _upsert(db: Session, product_ids: np.ndarray, discounts: np.ndarray):
+    """One set-based INSERT ... SELECT ... ON CONFLICT (product_id) DO UPDATE, with expiry_date taken straight from products."""
+    staged = _staged_discounts(db, product_ids, discounts)
+    rows = (
+        select(staged.c.product_id, staged.c.discount_percent, Product.expiry_date)
+        .join(Product, Product.id == staged.c.product_id)
+        .where(true())  # SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT ... JOIN
+    )
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(ExpiryTracking.__table__).from_select(["product_id", "discount_percent", "expiry_date"], rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ExpiryTracking.product_id],
+        set_={"discount_percent": stmt.excluded.discount_percent, "expiry_date": stmt.excluded.expiry_date},
+    )
+    db.connection().execute(stmt)
+
+def _to_datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+def _reprice(db: Session, now: datetime, notify: bool, product_ids: list[int] | None = None):
+    """Computes discounts (for all products, or just `product_ids`) and upserts only the rows that changed."""
+    now_epoch = now.replace(tzinfo=timezone.utc).timestamp()  # ✅ Naive, like expiry_date
+    only = product_ids is not None
+
+    ids, expiry, prices, vendor_ids, categories = _load_arrays(
+        db, Product.id, _epoch(db, Product.expiry_date), Product.price, func.coalesce(Product.vendor_id, -1), Product.category,
+        where=Product.id.in_(product_ids) if only else None,
+    )
+    discounts = compute_discounts(db, vendor_ids, (expiry - now_epoch) / SECONDS_PER_DAY, prices, categories)
+
+    # ✅ Compare with what is stored and only write rows whose discount or expiry date moved
+    tracked_ids, tracked_discounts, tracked_expiry = _load_arrays(
+        db, ExpiryTracking.product_id, ExpiryTracking.discount_percent, _epoch(db, ExpiryTracking.expiry_date),
+        where=ExpiryTracking.product_id.in_(product_ids) if only else None,
+    )
+    order = np.argsort(tracked_ids)
+    tracked_ids, tracked_discounts, tracked_expiry = tracked_ids[order], tracked_discounts[order], tracked_expiry[order]
+    position = np.minimum(np.searchsorted(tracked_ids, ids), max(len(tracked_ids) - 1, 0))
+    if len(tracked_ids):
+        known = tracked_ids[position] == ids
+        previous = np.where(known, tracked_discounts[position], 0.0)
+        changed = ~known | (previous != discounts) | (np.abs(tracked_expiry[position] - expiry) >= 1)
+    else:
+        previous = np.zeros(len(ids))
+        changed = np.ones(len(ids), dtype=bool)
+
+    updated = int(changed.sum())
+    if updated:
+        _upsert(db, ids[changed], discounts[changed])
+    repriced = changed & (previous != discounts)
+    record_prices(db, [  # ✅ Discount moves only (not expiry-date corrections), same transaction
+        {"product_id": int(product_id), "price": float(price), "discount_percent": float(discount), "changed_at": now}
+        for product_id, price, discount in zip(ids[repriced], prices[repriced], discounts[repriced])
+    ])
+    db.commit()
+    if updated:
+        refresh_deals(db)  # ✅ The deals feed sorts by discount, so rebuild it after a bulk price change
+
+    notified = 0
+    if notify:
+        # ✅ A deeper discount may satisfy saved searches ("baby formula at least 30% off")
+        deeper = ids[changed & (discounts > previous)].astype(int).tolist()
+        for start in range(0, len(deeper), NOTIFY_BATCH_SIZE):
+            notified += notify_saved_searches(db, deeper[start:start + NOTIFY_BATCH_SIZE])
+
+    return {"products": len(ids), "updated": updated, "notifications": notified}, ids, expiry, vendor_ids
+
+def recompute_discounts(db: Session, now: datetime | None = None, notify: bool = True):
+    """Recomputes discount_percent for the whole catalog in NumPy and upserts only the rows that changed."""
+    started = time.perf_counter()
+    stats, *_ = _reprice(db, now or datetime.now(), notify)
+    return {**stats, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+def load_discount_thresholds(db: Session):
+    """Hours to expiry at which discounts move: the default policy's, and {vendor_id: hours} for vendors with their own."""
+    return DEFAULT_POLICY.thresholds_hours, {
+        vendor_id: policy.thresholds_hours for vendor_id, policy in _vendor_policies(db).items()
+    }
+
+def load_expiring_products(db: Session, start: datetime, end: datetime):
+    """(product_id, expiry_date, vendor_id) for products expiring in (start, end]: a range scan on the expiry_date index."""
+    return db.execute(
+        select(Product.id, Product.expiry_date, Product.vendor_id).where(Product.expiry_date > start, Product.expiry_date <= end)
+    ).all()
+
+def apply_discount_transitions(db: Session, product_ids: list[int], now: datetime | None = None) -> dict[int, tuple]:
+    """Reprices products that just crossed an expiry threshold; returns {product_id: (expiry_date, vendor_id)} for rescheduling."""
+    _, ids, expiry, vendor_ids = _reprice(db, now or datetime.now(), True, product_ids)
+    return {
+        int(product_id): (_to_datetime(epoch), int(vendor_id) if vendor_id >= 0 else None)
+        for product_id, epoch, vendor_id in zip(ids, expiry, vendor_ids)
+    }
@@ -0,0 +1,12 @@
+def parse_fields(fields: str | None, allowed: tuple[str, ...]):
+    """Parses a comma-separated `fields=` value. Returns None when no projection was requested."""
+    if not fields:
+        return None
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    # ✅ `id` is always returned so clients can link to the full record
+    return tuple(dict.fromkeys(["id", *requested]))
@@ -0,0 +1,106 @@
+from sqlalchemy import select
+from models import VendorHours
+from datetime import datetime
+import re
+
+MINUTES_PER_DAY = 24 * 60
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# ✅ Keys that cover several days at once; single days may override them
+_DAY_GROUPS = {
+    "daily": range(7), "everyday": range(7), "all": range(7),
+    "weekdays": range(5), "weekends": range(5, 7),
+}
+
+_TIME = re.compile(r"^(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$")
+
+def _parse_day(name: str) -> int:
+    name = name.strip().lower()
+    for i, day in enumerate(WEEKDAYS):
+        if name == day or (len(name) >= 3 and day.startswith(name)):
+            return i
+    raise ValueError(f"Unknown day '{name}'")
+
+def _parse_days(key: str) -> list[int]:
+    """'monday' -> [0], 'mon-fri' -> [0..4], 'fri-mon' wraps, 'weekends' -> [5, 6]."""
+    key = key.strip().lower()
+    if key in _DAY_GROUPS:
+        return list(_DAY_GROUPS[key])
+    if "-" in key:
+        start, end = (_parse_day(part) for part in key.split("-", 1))
+        return [(start + i) % 7 for i in range((end - start) % 7 + 1)]
+    return [_parse_day(key)]
+
+def _parse_time(value: str) -> int:
+    """'9', '09:30', '6pm', '6:30 PM', '24:00' -> minutes after midnight."""
+    match = _TIME.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid time '{value.strip()}'")
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f"Invalid time '{value.strip()}'")
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    minutes = hour * 60 + minute
+    if minute > 59 or minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time '{value.strip()}'")
+    return minutes
+
+def _parse_ranges(value: str) -> list[tuple[int, int]]:
+    """'09:00-13:00, 14:00-18:00' -> [(540, 780), (840, 1080)]; 'closed' -> []."""
+    value = value.strip().lower()
+    if value in ("closed", ""):
+        return []
+    if value in ("24h", "24 hours", "open 24 hours"):
+        return [(0, MINUTES_PER_DAY)]
+    ranges = []
+    for part in value.split(","):
+        bounds = re.split(r"\s*(?:-|–|\bto\b)\s*", part.strip())
+        if len(bounds) != 2:
+            raise ValueError(f"Invalid hours '{part.strip()}', expected e.g. '09:00-18:00'")
+        opens, closes = _parse_time(bounds[0]), _parse_time(bounds[1])
+        if opens == closes:
+            raise ValueError(f"Invalid hours '{part.strip()}': opens and closes at the same time")
+        ranges.append((opens, closes))
+    return ranges
+
+def compile_operating_hours(operating_hours: dict | None) -> list[tuple[int, int, int]]:
+    """Compiles an operating_hours dict into (weekday, open_minute, close_minute) intervals.
+
+    Keys are days ('monday', 'mon'), day ranges ('mon-fri') or groups ('daily', 'weekdays', 'weekends');
+    a key naming fewer days overrides a broader one. Hours past midnight spill into the next day.
+    Raises ValueError when the dict can't be parsed.
+    """
+    days = {}
+    entries = sorted(((_parse_days(key), value) for key, value in (operating_hours or {}).items()),
+                     key=lambda entry: -len(entry[0]))
+    for weekdays, value in entries:
+        ranges = _parse_ranges(value)
+        for weekday in weekdays:
+            days[weekday] = ranges
+
+    intervals = []
+    for weekday, ranges in days.items():
+        for opens, closes in ranges:
+            if closes > opens:
+                intervals.append((weekday, opens, closes))
+            else:  # ✅ Overnight, e.g. 22:00-02:00
+                intervals.append((weekday, opens, MINUTES_PER_DAY))
+                if closes:
+                    intervals.append(((weekday + 1) % 7, 0, closes))
+    return sorted(intervals)
+
+def build_vendor_hours(operating_hours: dict | None) -> list[VendorHours]:
+    """Rows for the vendor_hours table compiled from `operating_hours`."""
+    return [VendorHours(weekday=d, open_minute=o, close_minute=c) for d, o, c in compile_operating_hours(operating_hours)]
+
+def open_vendor_ids(at: datetime | None = None):
+    """Subquery of vendor IDs open at `at` (default now): one indexed range lookup on vendor_hours."""
+    at = at or datetime.now()
+    minute = at.hour * 60 + at.minute
+    return select(VendorHours.vendor_id).where(
+        VendorHours.weekday == at.weekday(),
+        VendorHours.open_minute <= minute,
+        VendorHours.close_minute > minute,
+    )
@@ -1,64 +1,61 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from models import Order, Product
 from schemas import OrderCreate, OrderUpdate
+from crud.products import invalidate_products
 from datetime import datetime
 
 def create_order(db: Session, order: OrderCreate):
-    """Creates a new order and calculates total price."""
-    product = db.query(Product).filter(Product.id == order.product_id).first()
-    if not product:
-        return None  # Product doesn't exist
-
-    if product.quantity < order.quantity:
+    """Creates an order, taking the stock with one conditional UPDATE so concurrent checkouts can't oversell."""
+    products = Product.__table__
+    # ✅ Check and decrement in one statement: the row lock is held only until the order insert commits
+    price = db.connection().execute(
+        update(products)
+        .where(products.c.id == order.product_id, products.c.quantity >= order.quantity)
+        .values(quantity=products.c.quantity - order.quantity, version_id=products.c.version_id + 1)
+        .returning(products.c.price)
+    ).scalar()
+    if price is None:
+        db.rollback()
+        if not db.query(Product.id).filter(Product.id == order.product_id).first():
+            return None  # Product doesn't exist
         return {"error": "Not enough stock available"}
 
-    total_price = product.price * order.quantity
-
     db_order = Order(
         user_id=order.user_id,
         product_id=order.product_id,
         quantity=order.quantity,
-        total_price=total_price
+        total_price=price * order.quantity
     )
-    
-    product.quantity -= order.quantity  # ✅ Reduce stock after purchase
-
     db.add(db_order)
     db.commit()
+    invalidate_products(order.product_id)  # ✅ Cached stock is now stale
     db.refresh(db_order)
     return db_order
 
-def get_orders(db: Session):
-    """Fetches all orders and formats response."""
-    orders = db.query(Order).all()
-    return [
-        {
-            "id": o.id,
-            "user_id": o.user_id,
-            "product_id": o.product_id,
-            "quantity": o.quantity,
-            "total_price": o.total_price,
-            "status": o.status,
-            "created_at": o.created_at.strftime("%Y-%m-%d %H:%M:%S") if o.created_at else "N/A"
-        }
-        for o in orders
-    ]
-
-def get_order(db: Session, order_id: int):
-    """Fetches a single order by ID."""
-    o = db.query(Order).filter(Order.id == order_id).first()
-    if not o:
-        return None
+def format_order(o: Order):
+    """Converts an order into its response dict."""
     return {
         "id": o.id,
         "user_id": o.user_id,
-        "product_id": o.product_id,
+        "product_id": o.product_id if o.product_id is not None else o.archived_product_id,  # ✅ Archived products keep their ID
         "quantity": o.quantity,
         "total_price": o.total_price,
         "status": o.status,
         "created_at": o.created_at.strftime("%Y-%m-%d %H:%M:%S") if o.created_at else "N/A"
     }
 
+def get_orders(db: Session):
+    """Fetches all orders and formats response."""
+    return [format_order(o) for o in db.query(Order).all()]
+
+def get_order(db: Session, order_id: int):
+    """Fetches a single order by ID."""
+    o = db.query(Order).filter(Order.id == order_id).first()
+    if not o:
+        return None
+    return format_order(o)
+
 def update_order(db: Session, order_id: int, order_update: OrderUpdate):
     """Updates order status."""
     db_order = db.query(Order).filter(Order.id == order_id).first()
@@ -0,0 +1,52 @@
+from sqlalchemy import select, insert, func, literal
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import PriceHistory, Product, ExpiryTracking
+from serializers import PricePointOut, dump_json
+from datetime import datetime
+
+HISTORY_BATCH_SIZE = 10_000
+DEFAULT_HISTORY_LIMIT = 100
+MAX_HISTORY_LIMIT = 1000
+
+def record_product_prices(db: Session, product_ids: list[int], changed_at: datetime | None = None):
+    """Appends the current price and discount of `product_ids` in one INSERT ... SELECT. Caller commits."""
+    if not product_ids:
+        return
+    changed_at = changed_at or datetime.now()
+    db.execute(insert(PriceHistory).from_select(
+        ["product_id", "price", "discount_percent", "changed_at"],
+        select(Product.id, Product.price, func.coalesce(ExpiryTracking.discount_percent, 0.0), literal(changed_at, PriceHistory.changed_at.type))
+        .outerjoin(ExpiryTracking, ExpiryTracking.product_id == Product.id)
+        .where(Product.id.in_(product_ids)),
+    ))
+
+def record_prices(db: Session, rows: list[dict]):
+    """Appends precomputed {product_id, price, discount_percent, changed_at} rows as executemany batches. Caller commits."""
+    table = PriceHistory.__table__
+    for start in range(0, len(rows), HISTORY_BATCH_SIZE):
+        db.connection().execute(insert(table), rows[start:start + HISTORY_BATCH_SIZE])
+
+def get_price_history(db: Session, product_id: int, limit: int = DEFAULT_HISTORY_LIMIT):
+    """A product's price changes, newest first."""
+    return db.execute(
+        select(PriceHistory.price, PriceHistory.discount_percent, PriceHistory.changed_at)
+        .where(PriceHistory.product_id == product_id)
+        .order_by(PriceHistory.changed_at.desc(), PriceHistory.id.desc())
+        .limit(limit)
+    ).all()
+
+def stream_price_history(since: datetime | None = None, until: datetime | None = None, batch_size: int = HISTORY_BATCH_SIZE):
+    """Yields price history rows in [since, until) as NDJSON in insertion order, one batch at a time."""
+    db = SessionLocal()  # ✅ Own session: the request's session is closed before the body is streamed
+    try:
+        query = select(PriceHistory.product_id, PriceHistory.price, PriceHistory.discount_percent, PriceHistory.changed_at)
+        if since is not None:
+            query = query.where(PriceHistory.changed_at >= since)
+        if until is not None:
+            query = query.where(PriceHistory.changed_at < until)
+        result = db.execute(query.order_by(PriceHistory.id).execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            yield b"".join(dump_json(PricePointOut, row) + b"\n" for row in rows)
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+from sqlalchemy import update, values, column, case, cast, func, Integer, Float, Numeric
+from sqlalchemy.orm import Session
+from models import Product
+from schemas import BulkPriceUpdate
+from crud.products import invalidate_products
+from crud.saved_searches import notify_saved_searches
+from crud.price_history import record_product_prices
+
+MIN_PRICE = 0.01  # ✅ A deep percent cut on a cheap item must not round to a free (or zero) price
+
+def update_vendor_prices(db: Session, vendor_id: int, update_request: BulkPriceUpdate):
+    """Reprices many of a vendor's products with one set-based UPDATE ... RETURNING, in one transaction."""
+    products = Product.__table__  # ✅ Core update: version_id is bumped explicitly, no per-row ORM loads
+    stmt = update(products).where(products.c.vendor_id == vendor_id)
+
+    if update_request.prices is not None:
+        new_prices = {change.product_id: change.price for change in update_request.prices}
+        if db.get_bind().dialect.name == "postgresql":
+            # ✅ UPDATE products SET price = v.price FROM (VALUES (id, price), ...) AS v WHERE products.id = v.product_id
+            rows = values(column("product_id", Integer), column("price", Float), name="new_prices").data(list(new_prices.items()))
+            stmt = stmt.where(products.c.id == rows.c.product_id).values(price=rows.c.price)
+        else:
+            # ✅ SQLite can't name VALUES columns in FROM; a CASE over the same pairs is still one statement
+            stmt = stmt.where(products.c.id.in_(new_prices)).values(price=case(new_prices, value=products.c.id))
+    else:
+        factor = 1 + update_request.percent / 100  # ✅ percent > -100 (schema), so factor > 0
+        rounded = func.round(cast(products.c.price * factor, Numeric), 2)
+        stmt = stmt.values(price=case((rounded < MIN_PRICE, MIN_PRICE), else_=rounded))
+        if update_request.product_ids is not None:
+            stmt = stmt.where(products.c.id.in_(update_request.product_ids))
+
+    stmt = stmt.values(version_id=products.c.version_id + 1).returning(products.c.id, products.c.price, products.c.version_id)
+    updated = [dict(row) for row in db.connection().execute(stmt).mappings()]  # ✅ updated_at and change_seq via onupdate
+    product_ids = [row["id"] for row in updated]
+    record_product_prices(db, product_ids)  # ✅ One INSERT ... SELECT, same transaction
+    db.commit()
+
+    invalidate_products(*product_ids)
+    if product_ids:
+        # ✅ No deals-feed rebuild here: change_seq moved, so the deals job picks the new prices up on its next tick
+        notify_saved_searches(db, product_ids)  # ✅ A price cut may bring them under someone's ceiling
+
+    requested = [change.product_id for change in update_request.prices or []] or update_request.product_ids or []
+    found = set(product_ids)
+    return {"updated": updated, "missing": [i for i in dict.fromkeys(requested) if i not in found]}
@@ -1,8 +1,134 @@
+from sqlalchemy import tuple_, select, func, and_, or_, case, cast, bindparam, literal, literal_column, table, column, Float, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from models import Product
-from schemas import ProductCreate, ProductUpdate
-from datetime import datetime, timezone
+from database import SessionLocal
+from models import Product, ProductTombstone, Vendor, ExpiryTracking, next_change_seq, still_live
+from schemas import ProductCreate, ProductUpdate, ProductFilter
+from crud.fields import parse_fields
+from crud.hours import open_vendor_ids
+from crud.saved_searches import notify_saved_searches, sync_saved_searches
+from crud.price_history import record_product_prices
+from serializers import ProductOut, dump_json
+from http_cache import make_etag
+from cache import TTLCache
+from search_index import suggestions, fuzzy_names, vendor_locations, haversine_km, bounding_box
+from scheduler import expiry_scheduler
+from discount_policy import get_policy
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException
+import base64
+import itertools
+import json
+import os
+import re
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+MAX_CHANGES_PAGE_SIZE = 1000
+SYNC_SAFETY_LAG = timedelta(seconds=float(os.getenv("SYNC_SAFETY_LAG_SECONDS", "5")))  # ✅ See _settled_seq
+
+# ✅ Read-through cache for single-product reads; writes that touch a product invalidate it
+product_cache = TTLCache(
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "30")),
+)
+
+# Pre-encoded product JSON plus its validators, so a cache hit needs no DB round-trip or serialization
+CachedProduct = namedtuple("CachedProduct", ["body", "etag", "last_modified"])
+
+# ✅ Search score = relevance * (1 + SEARCH_EXPIRY_WEIGHT / (1 + days to expiry)): soon-to-expire matches rank higher
+SEARCH_EXPIRY_WEIGHT = 1.0
+
+# ✅ Fuzzy name search defaults (word similarity in [0, 1], top-K results)
+FUZZY_THRESHOLD = 0.5
+DEFAULT_FUZZY_LIMIT = 20
+MAX_FUZZY_LIMIT = 100
+
+# ✅ Facet counts are cached per normalized filter set; a short TTL keeps them roughly current
+facet_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("FACET_CACHE_TTL", "60")))
+
+# Price bands for facets: (upper bound, label), the last band is open-ended
+PRICE_BANDS = ((2, "0-2"), (5, "2-5"), (10, "5-10"), (20, "10-20"))
+PRICE_BAND_OVER = "20+"
+
+# ✅ "Deals near me" radius defaults, in kilometres
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 50.0
+
+# SQLite FTS5 index over products (see PRODUCT_SEARCH_DDL in models.py)
+_products_fts = table("products_fts", column("rowid"))
+
+# ✅ Fields a client may request with `fields=` (sparse fieldsets)
+PRODUCT_FIELDS = ("id", "name", "description", "price", "quantity", "expiry_date", "created_at", "vendor_id", "charity_eligible", "category")
+
+# ✅ Keyset column and direction for each sort; `id` breaks ties in the same direction
+_SORT_COLUMNS = {
+    "expiry": (Product.expiry_date, False),
+    "price": (Product.price, False),
+    "newest": (Product.created_at, True),
+}
+
+def _encode_cursor(sort: str, key, product_id: int) -> str:
+    """Encodes the sort key and id of the last row of a page into an opaque cursor."""
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([sort, key, product_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str, sort: str):
+    """Decodes a cursor back into (key, id) for `sort`. Raises ValueError if malformed."""
+    try:
+        cursor_sort, key, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort:
+            raise ValueError("Cursor was issued for a different sort")
+        if sort in ("price", "deals"):
+            return float(key), int(product_id)
+        if sort == "search":
+            now, score = key
+            return (datetime.fromisoformat(now), float(score)), int(product_id)
+        return datetime.fromisoformat(key), int(product_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _apply_filters(query, filters: ProductFilter | None):
+    """Adds the catalog filters to a product query as SQL predicates."""
+    if filters is None:
+        return query
+    if filters.min_price is not None:
+        query = query.filter(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(Product.price <= filters.max_price)
+    if filters.vendor_id is not None:
+        query = query.filter(Product.vendor_id == filters.vendor_id)
+    if filters.expires_within_days is not None:
+        now = datetime.now()
+        query = query.filter(still_live(Product.expiry_date, now), Product.expiry_date <= now + timedelta(days=filters.expires_within_days))
+    if filters.charity_eligible is not None:
+        query = query.filter(Product.charity_eligible == filters.charity_eligible)
+    if filters.in_stock:
+        query = query.filter(Product.quantity > 0)
+    if filters.business_category is not None:
+        query = query.filter(Product.vendor_id.in_(select(Vendor.id).where(Vendor.business_category == filters.business_category)))
+    if filters.open_at is not None or filters.open_now:
+        query = query.filter(Product.vendor_id.in_(open_vendor_ids(filters.open_at)))
+    return query
+
+def _apply_current_discount(db: Session, product: Product):
+    """Upserts the discount the product's policy gives it today (not at its next scheduled step); True if it moved."""
+    previous = db.scalar(select(ExpiryTracking.discount_percent).where(ExpiryTracking.product_id == product.id))
+    vendor = db.get(Vendor, product.vendor_id) if product.vendor_id is not None else None
+    policy = get_policy(product.vendor_id, vendor and vendor.version_id, vendor and vendor.discount_policy)
+    days_left = (product.expiry_date - datetime.now()).total_seconds() / 86400
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    discount = policy(days_left, product.price, product.category)
+    stmt = insert(ExpiryTracking).values(product_id=product.id, discount_percent=discount, expiry_date=product.expiry_date)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ExpiryTracking.product_id],
+        set_={"discount_percent": stmt.excluded.discount_percent, "expiry_date": stmt.excluded.expiry_date},
+    ))
+    return discount != (previous or 0.0)
 
 def create_product(db: Session, product: ProductCreate):
     """Creates a new product."""
@@ -15,63 +141,386 @@ def create_product(db: Session, product: ProductCreate):
         quantity=product.quantity,
         expiry_date=expiry_date,
         vendor_id=product.vendor_id,
+        category=product.category,
         created_at=datetime.now(timezone.utc)
     )
     db.add(db_product)
+    db.flush()
+    _apply_current_discount(db, db_product)
+    record_product_prices(db, [db_product.id])  # ✅ Opening price and discount, same transaction
     db.commit()
     db.refresh(db_product)
+    suggestions.add("product", db_product.id, db_product.name)
+    fuzzy_names.add(db_product.id, db_product.name)
+    expiry_scheduler.schedule(db_product.id, db_product.expiry_date, db_product.vendor_id)  # ✅ Queue its next step
+    notify_saved_searches(db, [db_product.id])
+    return db_product
 
-    # ✅ Convert to response format
-    return {
-        "id": db_product.id,
-        "name": db_product.name,
-        "description": db_product.description,
-        "price": db_product.price,
-        "quantity": db_product.quantity,
-        "expiry_date": db_product.expiry_date.strftime("%Y-%m-%d"),
-        "created_at": db_product.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "vendor_id": db_product.vendor_id,
-        "charity_eligible": db_product.charity_eligible
-    }
+def get_products(db: Session, filters: ProductFilter | None = None, sort: str = "expiry",
+                 limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None, fields: str | None = None):
+    """Fetches one filtered, sorted page of products (ORM rows, or Core rows when `fields` is given)."""
+    sort_column, descending = _SORT_COLUMNS[sort]
+    selected = parse_fields(fields, PRODUCT_FIELDS)
+    if selected:
+        # ✅ Select only the requested columns (plus the keyset column) instead of full ORM rows
+        query = db.query(*(getattr(Product, c) for c in selected), sort_column.label("sort_key"))
+    else:
+        query = db.query(Product)
+    query = _apply_filters(query, filters)
+    if cursor:
+        # ✅ Seek past the previous page instead of OFFSET, so deep pages cost the same as page one
+        key, last_id = _decode_cursor(cursor, sort)
+        position = tuple_(sort_column, Product.id)
+        query = query.filter(position < (key, last_id) if descending else position > (key, last_id))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(sort_column, Product.id)
+    products = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(products) > limit:  # ✅ One extra row tells us whether another page exists
+        products = products[:limit]
+        last = products[-1]
+        key = last.sort_key if selected else getattr(last, sort_column.key)
+        next_cursor = _encode_cursor(sort, key, last.id)
+
+    return {"items": products, "next_cursor": next_cursor}
 
-def get_products(db: Session):
-    """Fetches all products and formats response."""
-    products = db.query(Product).all()
-    
-    # ✅ Convert `expiry_date` & `created_at` to strings before returning
+def _facet_columns(now: datetime):
+    """Labelled facet expressions for one product row; none of them is ever NULL."""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    expiry = case(
+        (Product.expiry_date < today, "expired"),
+        (Product.expiry_date < today + timedelta(days=1), "today"),
+        (Product.expiry_date < today + timedelta(days=3), "3_days"),
+        (Product.expiry_date < today + timedelta(days=7), "week"),
+        else_="later",
+    )
+    price_band = case(*((Product.price < bound, label) for bound, label in PRICE_BANDS), else_=PRICE_BAND_OVER)
     return [
-        {
-            "id": p.id,
-            "name": p.name,
-            "description": p.description,
-            "price": p.price,
-            "quantity": p.quantity,
-            "expiry_date": p.expiry_date.strftime("%Y-%m-%d") if p.expiry_date else "N/A",  # ✅ Handle None values
-            "created_at": p.created_at.strftime("%Y-%m-%d %H:%M:%S") if p.created_at else "N/A",  # ✅ Ensure created_at exists
-            "vendor_id": p.vendor_id,
-            "charity_eligible": p.charity_eligible
-        }
+        func.coalesce(Vendor.business_category, "other").label("business_category"),
+        expiry.label("expiry"),
+        price_band.label("price_band"),
+        func.coalesce(Product.charity_eligible, False).label("charity_eligible"),
+    ]
+
+def _count_facets(db: Session, filters: ProductFilter | None):
+    facets = select(*_facet_columns(datetime.now())).select_from(Product).outerjoin(Vendor, Vendor.id == Product.vendor_id)
+    facets = _apply_filters(facets, filters).subquery()
+    columns = list(facets.c)
+    counts = {facet_col.name: {} for facet_col in columns}
+
+    if db.get_bind().dialect.name == "postgresql":
+        # ✅ One scan, one grouping set per facet; in each row only that facet's column is non-NULL
+        rows = db.execute(select(*columns, func.count()).group_by(func.grouping_sets(*columns)))
+        for *values, n in rows:
+            name, value = next((c.name, v) for c, v in zip(columns, values) if v is not None)
+            counts[name][value] = n
+    else:
+        # ✅ No GROUPING SETS on SQLite: group by every facet at once and roll the combinations up here
+        for *values, n in db.execute(select(*columns, func.count()).group_by(*columns)):
+            for facet_col, value in zip(columns, values):
+                counts[facet_col.name][value] = counts[facet_col.name].get(value, 0) + n
+
+    counts["charity_eligible"] = {str(bool(k)).lower(): n for k, n in counts["charity_eligible"].items()}
+    return {"total": sum(counts["expiry"].values()), **counts}
+
+def get_product_facets(db: Session, filters: ProductFilter | None = None):
+    """Counts matching products per category, expiry bucket, price band and charity flag (cached)."""
+    key = tuple(sorted(filters.model_dump(exclude_none=True).items())) if filters else ()
+    return facet_cache.get_or_load(key, lambda: _count_facets(db, filters))
+
+def _search_score(db: Session, q: str, now: datetime):
+    """Returns (match predicate, score expression) for query text `q`, or None if it has no searchable terms."""
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery("english", q)
+        search_vector = literal_column("products.search_vector")
+        match = search_vector.op("@@")(tsquery)
+        relevance = cast(func.ts_rank_cd(search_vector, tsquery), Float)
+        days_left = cast(func.extract("epoch", Product.expiry_date - bindparam("now", now, type_=DateTime)), Float) / 86400
+    else:
+        terms = re.findall(r"\w+", q)
+        if not terms:
+            return None
+        # ✅ Quote every term so user input can't inject FTS5 query syntax; terms are ANDed
+        match = literal_column("products_fts").match(" ".join('"%s"' % t for t in terms))
+        relevance = -func.bm25(literal_column("products_fts"))  # bm25() is lower-is-better
+        days_left = func.julianday(Product.expiry_date) - func.julianday(bindparam("now", now, type_=DateTime))
+    return match, relevance * (1 + SEARCH_EXPIRY_WEIGHT / (1 + days_left))
+
+def search_products(db: Session, q: str, filters: ProductFilter | None = None,
+                    limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+    """Full-text search over live products, best match first (keyset pagination over (score, id))."""
+    now = datetime.now()
+    if cursor:
+        # ✅ Score against the first page's clock, so pages stay consistent as expiry approaches
+        (now, last_score), last_id = _decode_cursor(cursor, "search")
+    searchable = _search_score(db, q, now)
+    if searchable is None:
+        return {"items": [], "next_cursor": None}
+    match, score = searchable
+
+    query = db.query(Product, score.label("score"))
+    if db.get_bind().dialect.name != "postgresql":
+        query = query.join(_products_fts, _products_fts.c.rowid == Product.id)
+    query = _apply_filters(query.filter(match, still_live(Product.expiry_date, now)), filters)
+    if cursor:
+        query = query.filter(or_(score < last_score, and_(score == last_score, Product.id > last_id)))
+    rows = query.order_by(score.desc(), Product.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor("search", [now.isoformat(), last.score], last.Product.id)
+    return {"items": [row.Product for row in rows], "next_cursor": next_cursor}
+
+def _load_fuzzy_names(db: Session):
+    products = db.execute(select(Product.id, Product.name)).yield_per(EXPORT_BATCH_SIZE)
+    fuzzy_names.rebuild((product_id, name) for product_id, name in products)
+
+# ✅ Highest change_seq this worker's cache and indexes have caught up with (see resync_search_indexes)
+_synced_seq = 0
+# ✅ (count, max(updated_at)) of vendors, and their IDs, when this worker's vendor entries were last synced
+_vendor_mark = None
+_vendor_ids = set()
+
+def _latest_seq(db: Session) -> int:
+    latest = max(db.scalar(select(func.max(Product.change_seq))) or 0, db.scalar(select(func.max(ProductTombstone.change_seq))) or 0)
+    cap = _settled_seq(db, 0)
+    return latest if cap is None else min(latest, cap)
+
+def _resync_vendors(db: Session):
+    """Re-reads vendors only when their (count, max(updated_at)) moved; there are few and they rarely change."""
+    global _vendor_mark, _vendor_ids
+    mark = tuple(db.execute(select(func.count(Vendor.id), func.max(Vendor.updated_at))).one())
+    if mark == _vendor_mark:
+        return 0
+    since = _vendor_mark[1] if _vendor_mark else None
+    vendors = db.execute(select(Vendor.id, Vendor.name, Vendor.latitude, Vendor.longitude, Vendor.updated_at)).all()
+    changed = [v for v in vendors if since is None or v.updated_at >= since]
+    for v in changed:
+        suggestions.add("vendor", v.id, v.name)
+        vendor_locations.add(v.id, v.latitude, v.longitude)  # ✅ Moved or cleared; a no-op unless the grid is built (SQLite)
+    removed = _vendor_ids - {v.id for v in vendors}
+    for vendor_id in removed:
+        suggestions.remove("vendor", vendor_id)
+        vendor_locations.remove(vendor_id)
+    _vendor_mark, _vendor_ids = mark, {v.id for v in vendors}
+    return len(changed) + len(removed)
+
+def resync_search_indexes(db: Session):
+    """Applies writes made through other workers to this worker's cache and indexes. Returns how many were applied.
+
+    Each worker only sees its own writes directly. Products are caught up from the delta-sync feed
+    (change_seq past this worker's mark); vendors from their (count, max(updated_at)).
+    """
+    global _synced_seq
+    applied = _resync_vendors(db)
+    fuzzy = fuzzy_names.ready and db.get_bind().dialect.name != "postgresql"
+    while True:
+        changes = get_product_changes(db, since=_synced_seq, limit=MAX_CHANGES_PAGE_SIZE)
+        changed, deleted = changes["changed"], changes["deleted"]
+        invalidate_products(*(p.id for p in changed), *deleted)
+        for p in changed:
+            suggestions.add("product", p.id, p.name)  # ✅ New or renamed
+            if fuzzy:
+                fuzzy_names.add(p.id, p.name)
+            expiry_scheduler.schedule(p.id, p.expiry_date, p.vendor_id)  # ✅ No-op unless this worker runs it
+        for product_id in deleted:
+            suggestions.remove("product", product_id)
+            if fuzzy:
+                fuzzy_names.remove(product_id)
+            expiry_scheduler.unschedule(product_id)
+        applied += len(changed) + len(deleted)
+        _synced_seq = changes["next_token"]
+        if not changes["has_more"]:
+            return applied
+
+def load_search_indexes(db: Session):
+    """Rebuilds this worker's in-memory search indexes from the database (run at worker start)."""
+    global _synced_seq, _vendor_mark, _vendor_ids
+    _synced_seq = _latest_seq(db)  # ✅ Taken first: writes racing the rebuild are replayed by the next resync
+    vendor_mark = tuple(db.execute(select(func.count(Vendor.id), func.max(Vendor.updated_at))).one())
+    products = db.execute(select(Product.id, Product.name)).yield_per(EXPORT_BATCH_SIZE)
+    vendors = db.execute(select(Vendor.id, Vendor.name)).yield_per(EXPORT_BATCH_SIZE)
+    suggestions.rebuild(itertools.chain(
+        (("product", product_id, name) for product_id, name in products),
+        (("vendor", vendor_id, name) for vendor_id, name in vendors),
+    ))
+    _vendor_mark, _vendor_ids = vendor_mark, set(db.scalars(select(Vendor.id)))
+    sync_saved_searches(db)
+    if db.get_bind().dialect.name != "postgresql":
+        # ✅ Postgres answers these from its pg_trgm and GiST indexes instead
+        _load_fuzzy_names(db)
+        _load_vendor_locations(db)
+
+def _load_vendor_locations(db: Session):
+    vendors = db.execute(select(Vendor.id, Vendor.latitude, Vendor.longitude).where(Vendor.latitude.is_not(None)))
+    vendor_locations.rebuild(vendors)
+
+def _vendors_within(db: Session, lat: float, lon: float, radius_km: float):
+    """Returns {vendor_id: distance_km} for vendors within `radius_km` of (lat, lon)."""
+    if db.get_bind().dialect.name == "postgresql":
+        # ✅ Box containment is answered by the GiST index; the exact circle is checked below
+        south, west, north, east = bounding_box(lat, lon, radius_km)
+        position = func.point(Vendor.longitude, Vendor.latitude)
+        box = func.box(func.point(west, south), func.point(east, north))
+        candidates = db.execute(select(Vendor.id, Vendor.latitude, Vendor.longitude).where(position.op("<@")(box)))
+        distances = {vendor_id: haversine_km(lat, lon, v_lat, v_lon) for vendor_id, v_lat, v_lon in candidates}
+        return {vendor_id: d for vendor_id, d in distances.items() if d <= radius_km}
+
+    if not vendor_locations.ready:
+        _load_vendor_locations(db)
+    return dict(vendor_locations.within(lat, lon, radius_km))
+
+def get_nearby_products(db: Session, lat: float, lon: float, radius_km: float = DEFAULT_RADIUS_KM,
+                        filters: ProductFilter | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Live products from vendors within `radius_km`, nearest vendor first, then soonest expiry."""
+    distances = _vendors_within(db, lat, lon, radius_km)
+    if not distances:
+        return []
+    distance = case(distances, value=Product.vendor_id)  # ✅ Sort by distance in SQL so LIMIT applies
+    query = db.query(Product).filter(Product.vendor_id.in_(distances), still_live(Product.expiry_date))
+    products = _apply_filters(query, filters).order_by(distance, Product.expiry_date, Product.id).limit(limit).all()
+    return [
+        {**{field: getattr(p, field) for field in PRODUCT_FIELDS}, "distance_km": round(distances[p.vendor_id], 3)}
         for p in products
     ]
 
-def get_product(db: Session, product_id: int):
-    """Fetches a single product by ID and formats response."""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+def fuzzy_search_products(db: Session, q: str, threshold: float = FUZZY_THRESHOLD, limit: int = DEFAULT_FUZZY_LIMIT):
+    """Typo-tolerant name search over live products: the top `limit` names by trigram word similarity."""
+    now = datetime.now()
+    if db.get_bind().dialect.name == "postgresql":
+        # ✅ `<%` is answered by the GIN trigram index; the threshold only applies to this transaction
+        db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(threshold), True)))
+        return (
+            db.query(Product)
+            .filter(literal(q).op("<%")(Product.name), still_live(Product.expiry_date, now))
+            .order_by(func.word_similarity(q, Product.name).desc(), Product.id)
+            .limit(limit)
+            .all()
+        )
+
+    if not fuzzy_names.ready:
+        _load_fuzzy_names(db)
+    ranked = [product_id for product_id, _ in fuzzy_names.search(q, threshold)]
+    products = []
+    for start in range(0, len(ranked), limit):  # ✅ Walk the ranking in chunks, skipping expired products
+        chunk = ranked[start:start + limit]
+        live = {p.id: p for p in db.query(Product).filter(Product.id.in_(chunk), still_live(Product.expiry_date, now))}
+        products.extend(live[product_id] for product_id in chunk if product_id in live)
+        if len(products) >= limit:
+            break
+    return products[:limit]
+
+def stream_products(format: str = "ndjson", filters: ProductFilter | None = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yields the whole catalog as NDJSON lines or a JSON array, one batch of rows at a time."""
+    # ✅ Own session: the request's `get_db` session is closed before a streaming body is sent
+    db = SessionLocal()
+    try:
+        query = _apply_filters(select(*(getattr(Product, f) for f in PRODUCT_FIELDS)), filters).order_by(Product.id)
+        # ✅ `yield_per` streams rows through a server-side cursor, so memory stays flat
+        result = db.execute(query.execution_options(yield_per=batch_size))
+
+        if format == "json":
+            yield b"["
+        first = True
+        for rows in result.partitions():
+            if format == "json":
+                # ✅ Encode the whole batch in one call and drop its brackets to splice it into the array
+                yield (b"" if first else b",") + dump_json(list[ProductOut], rows)[1:-1]
+            else:
+                yield b"".join(dump_json(ProductOut, row) + b"\n" for row in rows)
+            first = False
+        if format == "json":
+            yield b"]"
+    finally:
+        db.close()
+
+def _settled_seq(db: Session, since: int):
+    """Highest change_seq that is safe to hand out as a sync token, or None if there is no cap.
+
+    Postgres takes change_seq from a sequence at flush time, but the row only becomes visible at commit,
+    so a slow transaction can commit a lower seq after a reader has moved past it. Changes written in
+    the last SYNC_SAFETY_LAG are held back (the token stops just below the oldest of them); write
+    transactions must commit within that lag. SQLite serializes writers, so it needs no cap.
+    Only the recent rows are visited (range scans on the (updated_at / deleted_at, change_seq) indexes),
+    however far behind `since` is.
+    """
+    if db.get_bind().dialect.name != "postgresql":
         return None
+    settled_at = datetime.now(timezone.utc) - SYNC_SAFETY_LAG
+    pending = [
+        db.query(func.min(Product.change_seq)).filter(Product.updated_at > settled_at, Product.change_seq > since).scalar(),
+        db.query(func.min(ProductTombstone.change_seq)).filter(ProductTombstone.deleted_at > settled_at, ProductTombstone.change_seq > since).scalar(),
+    ]
+    pending = [seq for seq in pending if seq is not None]
+    return min(pending) - 1 if pending else None
+
+def get_product_changes(db: Session, since: int = 0, limit: int = DEFAULT_PAGE_SIZE):
+    """Fetches product inserts/updates and tombstones with change_seq > since, oldest first."""
+    cap = _settled_seq(db, since)
+    product_query = db.query(Product.change_seq).filter(Product.change_seq > since)
+    tombstone_query = db.query(ProductTombstone.change_seq).filter(ProductTombstone.change_seq > since)
+    if cap is not None:
+        product_query = product_query.filter(Product.change_seq <= cap)
+        tombstone_query = tombstone_query.filter(ProductTombstone.change_seq <= cap)
+
+    # ✅ Find where this page ends using only the change_seq indexes
+    product_seqs = product_query.order_by(Product.change_seq).limit(limit).all()
+    tombstone_seqs = tombstone_query.order_by(ProductTombstone.change_seq).limit(limit).all()
+    seqs = sorted(s for (s,) in product_seqs + tombstone_seqs)
+    if not seqs:
+        return {"changed": [], "deleted": [], "next_token": since, "has_more": False}
+
+    has_more = len(seqs) > limit or len(product_seqs) == limit or len(tombstone_seqs) == limit
+    upper = seqs[min(limit, len(seqs)) - 1]
 
+    # ✅ Fetch the whole (since, upper] range so a page never splits one sequence value
+    products = db.query(Product).filter(Product.change_seq > since, Product.change_seq <= upper).order_by(Product.change_seq).all()
+    tombstones = db.query(ProductTombstone.product_id).filter(ProductTombstone.change_seq > since, ProductTombstone.change_seq <= upper).order_by(ProductTombstone.change_seq).all()
     return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": product.price,
-        "quantity": product.quantity,
-        "expiry_date": product.expiry_date.strftime("%Y-%m-%d") if product.expiry_date else "N/A",
-        "created_at": product.created_at.strftime("%Y-%m-%d %H:%M:%S") if product.created_at else "N/A",
-        "vendor_id": product.vendor_id,
-        "charity_eligible": product.charity_eligible
+        "changed": products,
+        "deleted": [product_id for (product_id,) in tombstones],
+        "next_token": upper,
+        "has_more": has_more,
     }
 
+def get_products_by_ids(db: Session, product_ids: list[int]):
+    """Fetches several products with one IN query, keeping the requested order and reporting missing IDs."""
+    unique_ids = list(dict.fromkeys(product_ids))
+    by_id = {p.id: p for p in db.query(Product).filter(Product.id.in_(unique_ids)).all()}
+    return {
+        "products": [by_id[i] for i in unique_ids if i in by_id],
+        "missing": [i for i in unique_ids if i not in by_id],
+    }
+
+def get_vendor_products_validators(db: Session, vendor_id: int):
+    """Returns (count, max(updated_at), sum(version_id)) over a vendor's products; changes whenever the list does."""
+    return db.query(func.count(Product.id), func.max(Product.updated_at), func.sum(Product.version_id)).filter(Product.vendor_id == vendor_id).one()
+
+def get_product(db: Session, product_id: int):
+    """Fetches a single product by ID."""
+    return db.query(Product).filter(Product.id == product_id).first()
+
+def get_product_cached(db: Session, product_id: int):
+    """Fetches a single product through `product_cache`. Returns a CachedProduct, or None if missing."""
+    def load():
+        product = get_product(db, product_id)
+        if not product:
+            return None
+        etag = make_etag("product", product.id, product.version_id)
+        return CachedProduct(dump_json(ProductOut, product), etag, product.updated_at)
+
+    return product_cache.get_or_load(product_id, load)
+
+def invalidate_products(*product_ids: int):
+    """Drops products from the read cache; call after committing any change to them."""
+    product_cache.invalidate(*product_ids)
+
 
 def update_product(db: Session, product_id: int, product_update: ProductUpdate):
     """Updates product details."""
@@ -83,37 +532,59 @@ def update_product(db: Session, product_id: int, product_update: ProductUpdate):
         db_product.name = product_update.name
     if product_update.description:
         db_product.description = product_update.description
+    price_changed = bool(product_update.price) and product_update.price != db_product.price
     if product_update.price:
         db_product.price = product_update.price
     if product_update.quantity is not None:  # ✅ Allow updating quantity
         db_product.quantity = product_update.quantity
+    expiry_changed = False
     if product_update.expiry_date:
         try:
-            db_product.expiry_date = datetime.strptime(product_update.expiry_date, "%Y-%m-%d")  # ✅ Convert back to datetime
+            expiry_date = datetime.strptime(product_update.expiry_date, "%Y-%m-%d")  # ✅ Convert back to datetime
+            expiry_changed = expiry_date != db_product.expiry_date
+            db_product.expiry_date = expiry_date
         except ValueError:
             pass  # ✅ Prevent crash if incorrect format is provided
 
+    category_changed = bool(product_update.category) and product_update.category != db_product.category
+    if product_update.category:
+        db_product.category = product_update.category
+    discount_changed = False
+    if price_changed or expiry_changed or category_changed:
+        db.flush()
+        discount_changed = _apply_current_discount(db, db_product)  # ✅ Floor price and category overrides depend on these too
+    if price_changed or discount_changed:
+        record_product_prices(db, [product_id])
     db.commit()
+    invalidate_products(product_id)
     db.refresh(db_product)
+    suggestions.add("product", db_product.id, db_product.name)  # ✅ Re-index in case it was renamed
+    fuzzy_names.add(db_product.id, db_product.name)
+    if expiry_changed:
+        expiry_scheduler.schedule(db_product.id, db_product.expiry_date, db_product.vendor_id)
+    if price_changed:
+        notify_saved_searches(db, [db_product.id])  # ✅ A price cut may bring it under someone's ceiling
+    return db_product
 
-    # ✅ Convert to response format
-    return {
-        "id": db_product.id,
-        "name": db_product.name,
-        "description": db_product.description,
-        "price": db_product.price,
-        "quantity": db_product.quantity,
-        "expiry_date": db_product.expiry_date.strftime("%Y-%m-%d"),
-        "created_at": db_product.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "vendor_id": db_product.vendor_id,
-        "charity_eligible": db_product.charity_eligible
-    }
 
+def _write_tombstone(db: Session, product_id: int, vendor_id: int | None):
+    """Records a delete for sync clients; an existing tombstone for the ID is moved to the new change_seq."""
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(ProductTombstone).values(product_id=product_id, vendor_id=vendor_id, deleted_at=datetime.now(timezone.utc))
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ProductTombstone.product_id],
+        set_={"vendor_id": stmt.excluded.vendor_id, "deleted_at": stmt.excluded.deleted_at, "change_seq": next_change_seq()},
+    ))
 
 def delete_product(db: Session, product_id: int):
     """Deletes a product."""
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if db_product:
+        _write_tombstone(db, db_product.id, db_product.vendor_id)  # ✅ Tell sync clients
         db.delete(db_product)
         db.commit()
+        invalidate_products(product_id)
+        suggestions.remove("product", product_id)
+        fuzzy_names.remove(product_id)
+        expiry_scheduler.unschedule(product_id)
     return db_product
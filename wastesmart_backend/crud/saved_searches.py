@@ -0,0 +1,120 @@
+from sqlalchemy import select, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload
+from models import SavedSearch, SavedSearchMatch, Notification, Product, still_live
+from schemas import SavedSearchCreate
+from search_index import saved_searches, Subscription, ProductFacts, words
+from datetime import datetime
+
+# ✅ Bound on IDs per IN (...) list when checking many matches at once
+_ID_CHUNK = 5000
+
+def _subscription(s: SavedSearch) -> Subscription:
+    return Subscription(
+        s.id, s.user_id, frozenset((s.keywords or "").split()), s.max_price, s.min_discount_percent,
+        s.latitude, s.longitude, s.radius_km,
+    )
+
+def _chunks(ids: list):
+    for start in range(0, len(ids), _ID_CHUNK):
+        yield ids[start:start + _ID_CHUNK]
+
+def create_saved_search(db: Session, saved_search: SavedSearchCreate):
+    """Stores a saved search and adds it to this worker's match index."""
+    db_saved_search = SavedSearch(
+        user_id=saved_search.user_id,
+        keywords=" ".join(sorted(words(saved_search.query))) or None,  # ✅ Stored normalized
+        max_price=saved_search.max_price,
+        min_discount_percent=saved_search.min_discount_percent,
+        latitude=saved_search.latitude,
+        longitude=saved_search.longitude,
+        radius_km=saved_search.radius_km,
+        created_at=datetime.utcnow(),
+    )
+    db.add(db_saved_search)
+    db.commit()
+    db.refresh(db_saved_search)
+    saved_searches.add(_subscription(db_saved_search))
+    return db_saved_search
+
+def get_saved_searches(db: Session, user_id: int):
+    """Fetches all saved searches of a user."""
+    return db.query(SavedSearch).filter(SavedSearch.user_id == user_id).order_by(SavedSearch.id).all()
+
+def delete_saved_search(db: Session, saved_search_id: int):
+    """Deletes a saved search (other workers drop it from their index on their next match)."""
+    db_saved_search = db.query(SavedSearch).filter(SavedSearch.id == saved_search_id).first()
+    if db_saved_search:
+        db.delete(db_saved_search)
+        db.commit()
+        saved_searches.remove(saved_search_id)
+    return db_saved_search
+
+def sync_saved_searches(db: Session):
+    """Loads saved searches created since this worker's index was last synced (all of them at startup)."""
+    rows = db.query(SavedSearch).filter(SavedSearch.id > saved_searches.last_id).order_by(SavedSearch.id).yield_per(1000)
+    for row in rows:
+        saved_searches.add(_subscription(row))
+
+def notify_saved_searches(db: Session, product_ids: list[int]) -> int:
+    """Queues a notification for every saved search that the given products newly satisfy. Returns how many."""
+    sync_saved_searches(db)  # ✅ Picks up searches saved through other workers
+    if not len(saved_searches) or not product_ids:
+        return 0
+
+    products = (
+        db.query(Product)
+        .options(joinedload(Product.expiry_tracking), joinedload(Product.vendor))
+        .filter(Product.id.in_(product_ids), Product.quantity > 0, still_live(Product.expiry_date))
+        .all()
+    )
+    matches = []
+    for p in products:
+        discount = p.expiry_tracking.discount_percent if p.expiry_tracking else 0.0
+        price = round(p.price * (1 - discount / 100), 2)
+        vendor = p.vendor
+        facts = ProductFacts(
+            words(f"{p.name} {p.description or ''}"), price, discount,
+            vendor.latitude if vendor else None, vendor.longitude if vendor else None,
+        )
+        matches.extend((sub, p, price, discount) for sub in saved_searches.match(facts))
+    if not matches:
+        return 0
+
+    # ✅ Drop searches deleted through other workers, and deals each search has already been sent
+    sub_ids = sorted({sub.id for sub, *_ in matches})
+    live, sent = set(), set()
+    for chunk in _chunks(sub_ids):
+        live.update(db.scalars(select(SavedSearch.id).where(SavedSearch.id.in_(chunk))))
+        sent.update(db.execute(
+            select(SavedSearchMatch.saved_search_id, SavedSearchMatch.product_id)
+            .where(SavedSearchMatch.saved_search_id.in_(chunk), SavedSearchMatch.product_id.in_([p.id for p in products]))
+        ).tuples())
+    saved_searches.remove(*(set(sub_ids) - live))
+    new = [m for m in matches if m[0].id in live and (m[0].id, m[1].id) not in sent]
+    if not new:
+        return 0
+
+    now = datetime.utcnow()
+    # ✅ ON CONFLICT DO NOTHING: a pair another worker recorded concurrently is skipped, the rest still go out
+    upsert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    recorded = set(db.execute(
+        upsert(SavedSearchMatch)
+        .on_conflict_do_nothing(index_elements=[SavedSearchMatch.saved_search_id, SavedSearchMatch.product_id])
+        .returning(SavedSearchMatch.saved_search_id, SavedSearchMatch.product_id),
+        [{"saved_search_id": sub.id, "product_id": p.id, "matched_at": now} for sub, p, _, _ in new],
+    ).tuples())
+    new = [m for m in new if (m[0].id, m[1].id) in recorded]
+    if new:
+        db.execute(insert(Notification), [
+            {
+                "user_id": sub.user_id,
+                "message": f"New deal for your saved search '{' '.join(sorted(sub.keywords)) or 'deals'}': "
+                           f"{p.name} at {price:.2f} ({discount:.0f}% off)",
+                "read_status": False,
+                "created_at": now,
+            }
+            for sub, p, price, discount in new
+        ])
+    db.commit()
+    return len(new)
@@ -1,13 +1,78 @@
-from sqlalchemy.orm import Session
-from models import Vendor
-from schemas import VendorCreate, VendorUpdate
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from models import Vendor, Product, Review, still_live
+from schemas import VendorCreate, VendorUpdate, DiscountPolicySpec
+from crud.fields import parse_fields
+from crud.hours import build_vendor_hours, open_vendor_ids
+from crud.products import PRODUCT_FIELDS
+from search_index import suggestions, vendor_locations
+from discount_policy import invalidate_policy, get_policy
+from scheduler import expiry_scheduler
 from datetime import datetime
+import json
+import logging
+import numpy as np
 from passlib.context import CryptContext
 
+logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")  # ✅ Password hashing
 
+# ✅ Fields a client may request with `fields=` (sparse fieldsets)
+VENDOR_FIELDS = (
+    "id", "name", "contact", "location", "created_at", "email", "address", "business_category",
+    "business_description", "business_license", "logo_url", "operating_hours", "discount_policy",
+    "accepts_donations", "bank_account", "upi_id", "latitude", "longitude",
+)
+
+# ✅ Placeholder returned when an optional vendor field is empty
+_VENDOR_DEFAULTS = {
+    "contact": "N/A",
+    "location": "N/A",
+    "address": "N/A",
+    "business_category": "N/A",
+    "business_description": "N/A",
+    "business_license": "N/A",
+    "logo_url": "",
+    "operating_hours": {},
+    "discount_policy": "N/A",
+    "accepts_donations": False,
+    "bank_account": "N/A",
+    "upi_id": "N/A",
+}
+
+def _store_policy(policy: DiscountPolicySpec | str | None):
+    """Serializes a structured policy to JSON for the Text column; legacy free text is kept as is."""
+    if isinstance(policy, DiscountPolicySpec):
+        return policy.model_dump_json(exclude_none=True)
+    return policy or None
+
+def _policy_value(text: str):
+    """Structured policies (validated when stored) are returned as objects; anything else as the stored text."""
+    if text.lstrip().startswith("{"):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass  # ✅ Legacy free text that merely starts with "{"
+    return text
+
+def format_vendor(v, fields: tuple[str, ...] = VENDOR_FIELDS):
+    """Converts a vendor (ORM object or selected columns) into a response dict with only `fields`."""
+    formatted = {}
+    for field in fields:
+        value = getattr(v, field)
+        if field == "created_at":
+            value = value.isoformat() if value else "N/A"  # ✅ Convert datetime to string
+        elif not value and field in _VENDOR_DEFAULTS:
+            value = _VENDOR_DEFAULTS[field]
+        elif field == "discount_policy":
+            value = _policy_value(value)
+        formatted[field] = value
+    return formatted
+
 def create_vendor(db: Session, vendor: VendorCreate):
-    """Creates a new vendor with hashed password."""
+    """Creates a new vendor with hashed password. Raises ValueError if operating_hours can't be parsed."""
+    hours = build_vendor_hours(vendor.operating_hours)
     hashed_password = pwd_context.hash(vendor.password)  # ✅ Hash password
 
     db_vendor = Vendor(
@@ -21,32 +86,93 @@ def create_vendor(db: Session, vendor: VendorCreate):
         business_license=vendor.business_license or None,
         logo_url=vendor.logo_url or None,
         operating_hours=vendor.operating_hours or {},
-        discount_policy=vendor.discount_policy or None,
+        discount_policy=_store_policy(vendor.discount_policy),
         accepts_donations=vendor.accepts_donations if vendor.accepts_donations is not None else False,
         bank_account=vendor.bank_account or None,
         upi_id=vendor.upi_id or None,
-        created_at=datetime.utcnow()
+        latitude=vendor.latitude,
+        longitude=vendor.longitude,
+        created_at=datetime.utcnow(),
+        hours=hours,
     )
 
     db.add(db_vendor)
     db.commit()
+    suggestions.add("vendor", db_vendor.id, db_vendor.name)
+    vendor_locations.add(db_vendor.id, db_vendor.latitude, db_vendor.longitude)
     db.refresh(db_vendor)
     return db_vendor
 
-def get_vendors(db: Session):
-    """Fetch all vendors."""
-    return db.query(Vendor).all()
+def get_vendors(db: Session, fields: str | None = None, open_at: datetime | None = None):
+    """Fetch all vendors (only those open at `open_at` if given), loading only the requested columns when `fields` is given."""
+    selected = parse_fields(fields, VENDOR_FIELDS)
+    if selected:
+        query = db.query(*(getattr(Vendor, c) for c in selected))
+    else:
+        query = db.query(Vendor)
+    if open_at is not None:
+        query = query.filter(Vendor.id.in_(open_vendor_ids(open_at)))
+    vendors = query.all()
+    return [format_vendor(v, selected or VENDOR_FIELDS) for v in vendors]
+
+def backfill_vendor_hours(db: Session):
+    """Compiles vendor_hours for vendors written before it existed. Returns how many were compiled."""
+    compiled = 0
+    for vendor in db.query(Vendor).filter(~Vendor.hours.any(), Vendor.operating_hours.is_not(None)):
+        try:
+            vendor.hours = build_vendor_hours(vendor.operating_hours)
+            compiled += 1
+        except ValueError as e:
+            logger.warning("Skipping vendor %s: %s", vendor.id, e)  # ✅ Legacy free-text hours: fix via the vendor profile
+    db.commit()
+    return compiled
 
 def get_vendor(db: Session, vendor_id: int):
     """Fetch a single vendor by ID."""
     return db.query(Vendor).filter(Vendor.id == vendor_id).first()
 
+def get_vendor_storefront(db: Session, vendor_id: int):
+    """Fetch a vendor, their live products with current discount and their rating summary in two queries."""
+    now = datetime.now()
+    row = (
+        db.query(Vendor, func.avg(Review.rating), func.count(Review.id))
+        .outerjoin(Review, Review.vendor_id == Vendor.id)
+        .filter(Vendor.id == vendor_id)
+        .group_by(Vendor.id)
+        # ✅ Live products come back in one extra SELECT ... WHERE vendor_id IN (...)
+        .options(selectinload(Vendor.products.and_(still_live(Product.expiry_date, now), Product.quantity > 0)))
+        .first()
+    )
+    if not row:
+        return None
+
+    vendor, average_rating, review_count = row
+    products = sorted(vendor.products, key=lambda p: (p.expiry_date, p.id))
+    # ✅ Discounts as of now from the vendor's compiled policy, in one vectorized call
+    policy = get_policy(vendor.id, vendor.version_id, vendor.discount_policy)
+    discounts = policy.apply(
+        np.array([(p.expiry_date - now).total_seconds() / 86400 for p in products], dtype=np.float64),
+        np.array([p.price for p in products], dtype=np.float64),
+        np.array([p.category for p in products], dtype=object),
+    )
+    return {
+        "vendor": format_vendor(vendor),
+        "products": [
+            {**{field: getattr(p, field) for field in PRODUCT_FIELDS}, "discount_percent": float(discount)}
+            for p, discount in zip(products, discounts)
+        ],
+        "rating": {
+            "average": round(float(average_rating), 2) if average_rating is not None else None,
+            "count": review_count,
+        },
+    }
+
 def get_vendor_by_email(db: Session, email: str):
     """Fetch a vendor by email (case-insensitive)."""
     return db.query(Vendor).filter(Vendor.email.ilike(email)).first()  # ✅ Case insensitive lookup
 
 def update_vendor(db: Session, vendor_id: int, vendor_update: VendorUpdate):
-    """Update vendor details."""
+    """Update vendor details. Raises ValueError if operating_hours can't be parsed."""
     db_vendor = db.query(Vendor).filter(Vendor.id == vendor_id).first()
     if not db_vendor:
         return None
@@ -70,17 +196,27 @@ def update_vendor(db: Session, vendor_id: int, vendor_update: VendorUpdate):
     if vendor_update.logo_url:
         db_vendor.logo_url = vendor_update.logo_url
     if vendor_update.operating_hours:
+        db_vendor.hours = build_vendor_hours(vendor_update.operating_hours)  # ✅ Old intervals are deleted as orphans
         db_vendor.operating_hours = vendor_update.operating_hours
     if vendor_update.discount_policy:
-        db_vendor.discount_policy = vendor_update.discount_policy
+        db_vendor.discount_policy = _store_policy(vendor_update.discount_policy)
     if vendor_update.accepts_donations is not None:
         db_vendor.accepts_donations = vendor_update.accepts_donations
     if vendor_update.bank_account:
         db_vendor.bank_account = vendor_update.bank_account
     if vendor_update.upi_id:
         db_vendor.upi_id = vendor_update.upi_id
+    if vendor_update.latitude is not None:
+        db_vendor.latitude = vendor_update.latitude
+    if vendor_update.longitude is not None:
+        db_vendor.longitude = vendor_update.longitude
 
     db.commit()
+    suggestions.add("vendor", db_vendor.id, db_vendor.name)
+    invalidate_policy(vendor_id)  # ✅ Recompiled on next use
+    if vendor_update.discount_policy:
+        expiry_scheduler.reload_thresholds()  # ✅ Its products now step at the new policy's boundaries
+    vendor_locations.add(db_vendor.id, db_vendor.latitude, db_vendor.longitude)
     db.refresh(db_vendor)
     return db_vendor
 
@@ -90,4 +226,7 @@ def delete_vendor(db: Session, vendor_id: int):
     if db_vendor:
         db.delete(db_vendor)
         db.commit()
+        suggestions.remove("vendor", vendor_id)
+        vendor_locations.remove(vendor_id)
+        invalidate_policy(vendor_id)
     return db_vendor
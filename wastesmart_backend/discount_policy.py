@@ -0,0 +1,99 @@
+from pydantic import ValidationError
+from schemas import DiscountCurve, DiscountPolicySpec
+from cache import TTLCache
+import numpy as np
+import json
+import math
+
+# ✅ Used when a vendor has no structured policy: (at most this many days left, percent off)
+DEFAULT_DISCOUNT_STEPS = ((1, 50.0), (3, 30.0), (7, 15.0))
+
+def _compile_curve(curve: DiscountCurve):
+    """Turns a validated curve into a function from a days-to-expiry array to a percent-off array."""
+    if curve.curve == "linear":
+        start_days, max_percent = curve.start_days, curve.max_percent
+        # ✅ 0% at `start_days` out, rising linearly to `max_percent` on the expiry day
+        return lambda days_left: max_percent * np.clip((start_days - days_left) / start_days, 0.0, 1.0)
+
+    steps = sorted((step.days, step.percent) for step in curve.steps)
+    conditions = [days for days, _ in steps]
+    percents = [percent for _, percent in steps]
+    return lambda days_left: np.select([days_left <= days for days in conditions], percents, default=0.0)
+
+def _curve_boundaries(curve: DiscountCurve) -> set[float]:
+    """Days to expiry at which a curve's percent changes (every whole day along a linear ramp)."""
+    if curve.curve == "linear":
+        return {float(days) for days in range(1, math.ceil(curve.start_days))} | {curve.start_days}
+    return {step.days for step in curve.steps}
+
+class CompiledPolicy:
+    """A vendor's discount policy, parsed and validated once, applied to scalars or whole arrays."""
+
+    __slots__ = ("_curve", "_overrides", "cap_percent", "floor_price", "thresholds_hours")
+
+    def __init__(self, spec: DiscountPolicySpec):
+        self._curve = _compile_curve(spec)
+        self._overrides = {name.lower(): _compile_curve(c) for name, c in spec.category_overrides.items()}
+        self.cap_percent = spec.cap_percent
+        self.floor_price = spec.floor_price
+        # ✅ Hours to expiry where the discount moves, for the expiry scheduler (largest first)
+        boundaries = _curve_boundaries(spec).union(*(_curve_boundaries(c) for c in spec.category_overrides.values()))
+        self.thresholds_hours = tuple(sorted((days * 24 for days in boundaries if days > 0), reverse=True))
+
+    def apply(self, days_left: np.ndarray, prices: np.ndarray | None = None, categories: np.ndarray | None = None) -> np.ndarray:
+        """Percent off for every product at once."""
+        percent = self._curve(days_left)
+        if self._overrides and categories is not None:
+            lowered = np.array([(c or "").lower() for c in categories], dtype=object)
+            for name, curve in self._overrides.items():
+                mask = lowered == name
+                if mask.any():
+                    percent = np.where(mask, curve(days_left), percent)
+        if self.cap_percent is not None:
+            percent = np.minimum(percent, self.cap_percent)
+        if self.floor_price is not None and prices is not None:
+            # ✅ Never discount below the floor price (and never mark up items already under it)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                limit = np.where(prices > 0, (1 - self.floor_price / prices) * 100, 0.0)
+            percent = np.minimum(percent, np.maximum(limit, 0.0))
+        return percent
+
+    def __call__(self, days_left: float, price: float | None = None, category: str | None = None) -> float:
+        """Percent off for one product."""
+        prices = None if price is None else np.array([price], dtype=np.float64)
+        categories = None if category is None else np.array([category], dtype=object)
+        return float(self.apply(np.array([days_left], dtype=np.float64), prices, categories)[0])
+
+DEFAULT_POLICY = CompiledPolicy(DiscountPolicySpec(
+    curve="step", steps=[{"days": days, "percent": percent} for days, percent in DEFAULT_DISCOUNT_STEPS],
+))
+
+def parse_policy(text: str | None) -> DiscountPolicySpec | None:
+    """Reads a stored policy. Legacy free-text policies (not a JSON object) return None."""
+    if not text or not text.lstrip().startswith("{"):
+        return None
+    try:
+        return DiscountPolicySpec.model_validate(json.loads(text))
+    except (ValueError, ValidationError):
+        return None
+
+# ✅ vendor_id -> (version_id, CompiledPolicy); update_vendor invalidates, the version guards other workers
+policy_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+def get_policy(vendor_id: int | None, version_id: int | None, policy_text: str | None) -> CompiledPolicy:
+    """Returns the vendor's compiled policy (DEFAULT_POLICY if they have none), compiling at most once per version."""
+    if vendor_id is None:
+        return DEFAULT_POLICY
+
+    def compile_policy():
+        spec = parse_policy(policy_text)
+        return version_id, CompiledPolicy(spec) if spec else DEFAULT_POLICY
+
+    cached_version, policy = policy_cache.get_or_load(vendor_id, compile_policy)
+    if cached_version != version_id:  # ✅ Vendor was updated through another worker
+        policy_cache.invalidate(vendor_id)
+        cached_version, policy = policy_cache.get_or_load(vendor_id, compile_policy)
+    return policy
+
+def invalidate_policy(vendor_id: int):
+    policy_cache.invalidate(vendor_id)
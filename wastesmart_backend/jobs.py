@@ -0,0 +1,105 @@
+from sqlalchemy import text
+from database import SessionLocal, engine
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ✅ "auto": one worker (Postgres advisory lock holder) runs the background jobs; "1"/"0" force it on/off here
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "auto")
+LEADER_LOCK_KEY = 0x57534A42  # ✅ Any fixed bigint; shared by every worker of this app
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "30"))
+
+class PeriodicJob:
+    """Runs `task(db)` every `interval` seconds on a daemon thread, each run in its own session."""
+
+    def __init__(self, name: str, interval: float, task):
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return  # ✅ interval 0 disables the job (e.g. when another worker or cron runs it)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                self.task(db)
+            except Exception:
+                db.rollback()
+                logger.exception("Periodic job %s failed", self.name)  # ✅ Keep running; the next tick retries
+            finally:
+                db.close()
+
+class LeaderLock:
+    """Elects the one worker that runs the background jobs, so N uvicorn workers don't each run them.
+
+    On Postgres the leader holds a session-level advisory lock on a dedicated connection; when it exits
+    (or its connection drops) the lock is released and another worker takes over on its next retry.
+    SQLite deployments are single-process, so every worker is its own leader.
+    """
+
+    def __init__(self, key: int = LEADER_LOCK_KEY, retry: float = LEADER_RETRY_SECONDS):
+        self.key = key
+        self.retry = retry
+        self._connection = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _try_acquire(self) -> bool:
+        if BACKGROUND_JOBS in ("0", "1"):
+            return BACKGROUND_JOBS == "1"
+        if engine.dialect.name != "postgresql":
+            return True
+        connection = engine.connect()  # ✅ Held for as long as we lead: the lock lives with this session
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if acquired:
+            self._connection = connection
+            return True
+        connection.close()
+        return False
+
+    def start(self, on_elected):
+        """Calls `on_elected()` once this worker becomes the leader (now, or on a later retry)."""
+        if self._try_acquire():
+            on_elected()
+        elif BACKGROUND_JOBS == "auto":
+            self._thread = threading.Thread(target=self._run, args=(on_elected,), name="leader-lock", daemon=True)
+            self._thread.start()
+
+    def _run(self, on_elected):
+        while not self._stop.wait(self.retry):
+            try:
+                if self._try_acquire():
+                    logger.info("This worker is now running the background jobs")
+                    on_elected()
+                    return
+            except Exception:
+                logger.exception("Leader election failed")  # ✅ Keep retrying
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._connection is not None:
+            self._connection.invalidate()  # ✅ Really closes it (not back to the pool), releasing the lock
+            self._connection = None
@@ -1,4 +1,12 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from database import SessionLocal
+from crud.products import load_search_indexes, resync_search_indexes
+from crud.deals import refresh_deals_if_stale
+from crud.archive import archive_products
+from crud.expiry_tracking import recompute_discounts, load_discount_thresholds, load_expiring_products, apply_discount_transitions
+from jobs import PeriodicJob, LeaderLock
+from scheduler import expiry_scheduler
 from fastapi.middleware.cors import CORSMiddleware
 from routes.users import router as user_router
 from routes.products import router as product_router
@@ -8,10 +16,54 @@ from routes.vendors import router as vendor_router
 from routes.charities import router as charity_router 
 from routes.notifications import router as notification_router
 from routes.donations import router as donation_router
+from routes.saved_searches import router as saved_search_router
 from auth import router as auth_router
+import os
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ✅ Warm this worker's in-memory indexes before serving requests
+    db = SessionLocal()
+    try:
+        load_search_indexes(db)
+    finally:
+        db.close()
+
+    # ✅ Every worker: catch up with product writes made through the other workers (cache, indexes)
+    resync_job = PeriodicJob("resync-indexes", float(os.getenv("INDEX_RESYNC_SECONDS", "5")), resync_search_indexes)
+    resync_job.start()
+
+    # ✅ Keep the deals feed fresh as products are repriced, sell out and age into / out of the window.
+    # Cheap check every few seconds; the rebuild runs only when products changed (or DEALS_REFRESH_SECONDS passed)
+    deals_job = PeriodicJob("refresh-deals", float(os.getenv("DEALS_CHECK_SECONDS", "10")), refresh_deals_if_stale)
+
+    # ✅ Keep `products` small: expired and sold-out items move to products_archive in bounded batches
+    archive_job = PeriodicJob("archive-products", float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600")), archive_products)
+
+    # ✅ Safety net behind the scheduler: full-catalog recompute catches anything it missed (e.g. while down)
+    recompute_job = PeriodicJob("recompute-discounts", float(os.getenv("DISCOUNT_RECOMPUTE_SECONDS", "3600")), recompute_discounts)
+
+    def start_background_jobs():
+        deals_job.start()
+        archive_job.start()
+        recompute_job.start()
+        # ✅ Step discounts up the moment products cross one of their policy's days-to-expiry boundaries
+        if os.getenv("EXPIRY_SCHEDULER", "1") != "0":
+            expiry_scheduler.start(SessionLocal, load_discount_thresholds, load_expiring_products, apply_discount_transitions)
+
+    # ✅ Catalog-wide jobs run in one worker only, however many uvicorn workers serve requests
+    leader = LeaderLock()
+    leader.start(start_background_jobs)
+    yield
+    leader.stop()
+    expiry_scheduler.stop()
+    recompute_job.stop()
+    archive_job.stop()
+    deals_job.stop()
+    resync_job.stop()
 
 # Initialize FastAPI App
-app = FastAPI(title="WasteSmart API", version="1.0")
+app = FastAPI(title="WasteSmart API", version="1.0", lifespan=lifespan)
 
 # Add CORS Middleware (PUT THIS RIGHT AFTER CREATING `app`)
 app.add_middleware(
@@ -31,6 +83,7 @@ app.include_router(vendor_router, prefix="/vendors", tags=["Vendors"])
 app.include_router(charity_router, prefix="/charities", tags=["Charities"]) 
 app.include_router(notification_router, prefix="/notifications", tags=["Notifications"])  
 app.include_router(donation_router, prefix="/donations", tags=["Donations"]) 
+app.include_router(saved_search_router, prefix="/saved-searches", tags=["Saved Searches"])
 app.include_router(auth_router, prefix="/auth")
 
 
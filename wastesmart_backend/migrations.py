@@ -0,0 +1,68 @@
+"""Idempotent in-place upgrade for databases created before the current models.
+
+`Base.metadata.create_all` only creates missing tables: it never adds a column, an index or the
+search/deals objects to a table that already exists. `upgrade_schema` does, and is safe to run
+any number of times (`python database.py` runs it right after `create_all`).
+"""
+from sqlalchemy import inspect, text
+from models import Base, PRODUCT_SEARCH_DDL, DEALS_DDL, VENDOR_LOCATION_DDL
+
+# (table, column, backfill for existing rows); columns declared NOT NULL get the constraint after the backfill
+ADDED_COLUMNS = [
+    ("vendors", "latitude", None),
+    ("vendors", "longitude", None),
+    ("vendors", "version_id", "1"),
+    ("vendors", "updated_at", "coalesce(created_at, CURRENT_TIMESTAMP)"),
+    ("products", "category", None),
+    ("products", "version_id", "1"),
+    ("products", "updated_at", "coalesce(created_at, CURRENT_TIMESTAMP)"),
+    ("products", "change_seq", {
+        "postgresql": "nextval('products_change_seq')",
+        "sqlite": "id + (SELECT coalesce(max(change_seq), 0) FROM product_tombstones)",
+    }),
+    ("orders", "archived_product_id", None),
+    ("charity_donations", "archived_product_id", None),
+]
+
+def _column_ddl(column, dialect):
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    for fk in column.foreign_keys:
+        ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+    return ddl
+
+def upgrade_schema(engine):
+    """Adds and backfills the columns, indexes and search/deals objects an older database is missing.
+
+    Run after `create_all` (which creates the sequence and any new tables). One transaction, so a
+    failed run leaves nothing half-applied. On SQLite the added columns stay nullable in the
+    database (it cannot add a constraint to an existing column); the models always fill them.
+    """
+    dialect = engine.dialect
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        had_fts = dialect.name == "sqlite" and inspector.has_table("products_fts")
+        for table_name, column_name, backfill in ADDED_COLUMNS:
+            column = Base.metadata.tables[table_name].c[column_name]
+            existing = {c["name"]: c for c in inspector.get_columns(table_name)}
+            if column_name not in existing:
+                if_not_exists = "IF NOT EXISTS " if dialect.name == "postgresql" else ""
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {if_not_exists}{_column_ddl(column, dialect)}"))
+            if isinstance(backfill, dict):
+                backfill = backfill[dialect.name]
+            if backfill is not None:
+                conn.execute(text(f"UPDATE {table_name} SET {column_name} = {backfill} WHERE {column_name} IS NULL"))
+            if dialect.name == "postgresql" and not column.nullable and existing.get(column_name, {"nullable": True})["nullable"]:
+                conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL"))
+
+        # ✅ Model indexes on tables that predate them, then the after_create DDL those tables never ran
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        statements = list(PRODUCT_SEARCH_DDL.get(dialect.name, []))
+        statements += [s for s in DEALS_DDL.get(dialect.name, []) if s.startswith("CREATE")]  # crud.deals.refresh_deals fills it
+        if dialect.name == "postgresql":
+            statements.append(VENDOR_LOCATION_DDL)
+        for statement in statements:
+            conn.execute(text(statement))
+        if dialect.name == "sqlite" and not had_fts:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))  # Index the existing rows
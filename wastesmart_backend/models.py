@@ -1,8 +1,39 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Float, DateTime, Boolean, Text, JSON, Index, Sequence, DDL, event, Table, MetaData
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement, literal_column
+from sqlalchemy.ext.compiler import compiles
 from database import Base
 from datetime import datetime, timezone
 
+# ====================== CHANGE SEQUENCE ======================
+
+# Monotonic sequence stamped on every product write and tombstone (delta sync)
+product_change_seq = Sequence("products_change_seq", metadata=Base.metadata)
+
+class next_change_seq(FunctionElement):
+    """SQL expression for the next product change sequence value."""
+    type = BigInteger()
+    inherit_cache = True
+
+@compiles(next_change_seq)
+def _compile_next_change_seq(element, compiler, **kw):
+    # ✅ No sequences on SQLite, but it serializes writers, so max + 1 is safe there
+    return ("(SELECT coalesce(max(seq), 0) + 1 FROM ("
+            "SELECT max(change_seq) AS seq FROM products "
+            "UNION ALL SELECT max(change_seq) FROM product_tombstones))")
+
+@compiles(next_change_seq, "postgresql")
+def _compile_next_change_seq_postgresql(element, compiler, **kw):
+    return compiler.process(product_change_seq.next_value(), **kw)
+
+# ✅ Plain `version_id = version_id + 1` on every ORM update. Not a mapper version_id_col: checkout, bulk
+# repricing and the discount engine bump it from Core too, and a version check would fail concurrent ORM writes.
+_bump_version = literal_column("version_id") + 1
+
+def still_live(expiry_date, now: datetime | None = None):
+    """The one "not expired yet" predicate: expiry dates are days, so a product stays live through its expiry day."""
+    return expiry_date >= (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
 # ====================== CORE TABLES ======================
 
 # User Model
@@ -13,7 +44,7 @@ class User(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
-    role = Column(String, default="customer")  # Can be 'customer', 'vendor', 'charity'
+    role = Column(String, default="customer")  # Can be 'customer', 'vendor', 'charity', 'admin'
 
     orders = relationship("Order", back_populates="user")
     payments = relationship("Payment", back_populates="user")
@@ -45,8 +76,34 @@ class Vendor(Base):
     bank_account = Column(String)  # ✅ New: Vendor payout details
     upi_id = Column(String)  # ✅ New: UPI / PayPal ID for transactions
 
+    latitude = Column(Float, nullable=True)  # ✅ Geo position for "deals near me"
+    longitude = Column(Float, nullable=True)
+
+    version_id = Column(Integer, nullable=False, default=1, onupdate=_bump_version)  # ✅ Row version, bumped on every update (ETag)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
     products = relationship("Product", back_populates="vendor")
     reviews = relationship("Review", back_populates="vendor")
+    hours = relationship("VendorHours", cascade="all, delete-orphan")  # ✅ Compiled from operating_hours on write
+
+# Vendor Hours Model (operating_hours compiled into weekly intervals, for "open now" lookups)
+class VendorHours(Base):
+    __tablename__ = "vendor_hours"
+
+    id = Column(Integer, primary_key=True)
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday
+    open_minute = Column(Integer, nullable=False)  # Minutes after midnight
+    close_minute = Column(Integer, nullable=False)  # Exclusive; 1440 = midnight
+
+    __table_args__ = (
+        Index("ix_vendor_hours_weekday_open_close", "weekday", "open_minute", "close_minute"),
+    )
+
+# ✅ Postgres: GiST index on the vendor's position as a built-in point (no PostGIS needed) for radius lookups.
+# Other databases use the in-memory grid in search_index.py instead.
+VENDOR_LOCATION_DDL = "CREATE INDEX IF NOT EXISTS ix_vendors_location_gist ON vendors USING gist (point(longitude, latitude))"
+event.listen(Vendor.__table__, "after_create", DDL(VENDOR_LOCATION_DDL).execute_if(dialect="postgresql"))
 
 # Product Model
 class Product(Base):
@@ -61,19 +118,101 @@ class Product(Base):
     created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))  # ✅ Fix column type
     vendor_id = Column(Integer, ForeignKey("vendors.id"))
     charity_eligible = Column(Boolean, default=False)  
+    category = Column(String, nullable=True)  # ✅ e.g. dairy, bakery
+    version_id = Column(Integer, nullable=False, default=1, onupdate=_bump_version)  # ✅ Row version, bumped on every update (ETag)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    change_seq = Column(BigInteger, nullable=False, index=True, default=next_change_seq(), onupdate=next_change_seq())  # ✅ Delta-sync position
 
     vendor = relationship("Vendor", back_populates="products")
     orders = relationship("Order", back_populates="product")
-    expiry_tracking = relationship("ExpiryTracking", uselist=False, back_populates="product")
+    expiry_tracking = relationship("ExpiryTracking", uselist=False, back_populates="product", cascade="all, delete-orphan")  # ✅ Goes with its product
     charity_donations = relationship("CharityDonation", back_populates="product")
 
+    # ✅ One composite index per supported (equality filter, sort) pair, each ending in the keyset order
+    __table_args__ = (
+        Index("ix_products_expiry_date_id", "expiry_date", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_vendor_expiry_date_id", "vendor_id", "expiry_date", "id"),
+        Index("ix_products_vendor_price_id", "vendor_id", "price", "id"),
+        Index("ix_products_vendor_created_at_id", "vendor_id", "created_at", "id"),
+        Index("ix_products_charity_expiry_date_id", "charity_eligible", "expiry_date", "id"),
+        Index("ix_products_charity_price_id", "charity_eligible", "price", "id"),
+        Index("ix_products_charity_created_at_id", "charity_eligible", "created_at", "id"),
+        Index("ix_products_quantity_updated_at", "quantity", "updated_at"),  # ✅ Sold-out lookups for archiving
+        Index("ix_products_updated_at_change_seq", "updated_at", "change_seq"),  # ✅ Recent writes for the sync-token cap
+        {"sqlite_autoincrement": True},  # ✅ Never reuse a deleted ID (tombstones, archive and orders refer to it)
+    )
+# ✅ Full-text and trigram search over products, created alongside `products`.
+# Postgres: generated tsvector column with a GIN index. SQLite: external-content FTS5 table kept in sync by triggers.
+PRODUCT_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING GIN (name gin_trgm_ops)",  # fuzzy search
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+        "name, description, content='products', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    ],
+}
+for _dialect, _statements in PRODUCT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Product.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
+
+# Product Tombstone Model (Records deletes for delta-sync clients)
+class ProductTombstone(Base):
+    __tablename__ = "product_tombstones"
+
+    product_id = Column(Integer, primary_key=True)  # No FK: the product row is gone
+    vendor_id = Column(Integer)
+    change_seq = Column(BigInteger, nullable=False, index=True, default=next_change_seq())
+    deleted_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_product_tombstones_deleted_at_change_seq", "deleted_at", "change_seq"),  # ✅ Recent deletes for the sync-token cap
+    )
+
+# Product Archive Model (Expired and sold-out products moved out of `products`, keeping their IDs;
+# orders and charity donations are re-pointed from product_id to archived_product_id in the same transaction)
+class ProductArchive(Base):
+    __tablename__ = "products_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # ✅ Same ID as in `products`, so orders still resolve
+    name = Column(String, nullable=False)
+    description = Column(Text)
+    price = Column(Float, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expiry_date = Column(DateTime, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    vendor_id = Column(Integer, ForeignKey("vendors.id"))
+    charity_eligible = Column(Boolean, default=False)
+    category = Column(String, nullable=True)
+    discount_percent = Column(Float, nullable=True)  # ✅ Last expiry_tracking discount
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_products_archive_vendor_id_id", "vendor_id", "id"),
+    )
+
 # Order Model
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)  # ✅ Moved to archived_product_id when archived
+    archived_product_id = Column(Integer, ForeignKey("products_archive.id"), index=True)
     quantity = Column(Integer, nullable=False)
     total_price = Column(Float, nullable=False)
     status = Column(String, default="pending")  # 'pending', 'completed', 'canceled'
@@ -81,6 +220,7 @@ class Order(Base):
 
     user = relationship("User", back_populates="orders")
     product = relationship("Product", back_populates="orders")
+    archived_product = relationship("ProductArchive")
 
 # ====================== EXPIRY & CHARITY TABLES ======================
 # Expiry Tracking Model
@@ -94,6 +234,85 @@ class ExpiryTracking(Base):
 
     product = relationship("Product", back_populates="expiry_tracking")
 
+# Price History Model (Append-only: one narrow row per list-price or discount change)
+class PriceHistory(Base):
+    __tablename__ = "price_history"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    product_id = Column(Integer, nullable=False)  # No FK: history outlives archived products
+    price = Column(Float, nullable=False)
+    discount_percent = Column(Float, nullable=False, default=0.0)
+    changed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_price_history_product_id_changed_at", "product_id", "changed_at"),
+    )
+
+# ✅ Rows arrive in time order, so a tiny BRIN index serves time-range exports on Postgres
+event.listen(PriceHistory.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_price_history_changed_at_brin ON price_history USING brin (changed_at)"
+).execute_if(dialect="postgresql"))
+event.listen(PriceHistory.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_price_history_changed_at ON price_history (changed_at)"
+).execute_if(dialect="sqlite"))
+
+# ====================== DEALS FEED ======================
+
+# ✅ Live products expiring from today through the next DEALS_HORIZON_DAYS, with vendor name and effective price.
+# Postgres keeps it as a materialized view (its unique index allows REFRESH ... CONCURRENTLY);
+# SQLite has no materialized views, so it is a plain table that crud.deals.refresh_deals refills.
+DEALS_HORIZON_DAYS = 7
+
+_DEALS_COLUMNS = (
+    "SELECT p.id AS product_id, p.vendor_id, v.name AS vendor_name, p.name, p.price, p.quantity, p.expiry_date, "
+    "coalesce(e.discount_percent, 0) AS discount_percent, "
+    "round(CAST(p.price * (1 - coalesce(e.discount_percent, 0) / 100.0) AS numeric), 2) AS effective_price "
+    "FROM products p LEFT JOIN vendors v ON v.id = p.vendor_id LEFT JOIN expiry_tracking e ON e.product_id = p.id "
+    "WHERE p.quantity > 0 "
+)
+DEALS_QUERY = {
+    "postgresql": _DEALS_COLUMNS + (
+        "AND p.expiry_date >= CURRENT_DATE "
+        f"AND p.expiry_date < CURRENT_DATE + {DEALS_HORIZON_DAYS + 1}"
+    ),
+    "sqlite": _DEALS_COLUMNS + (
+        "AND p.expiry_date >= date('now', 'localtime') "
+        f"AND p.expiry_date < date('now', 'localtime', '+{DEALS_HORIZON_DAYS + 1} days')"
+    ),
+}
+DEALS_DDL = {
+    "postgresql": [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS expiring_deals AS {DEALS_QUERY['postgresql']}",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_expiring_deals_product_id ON expiring_deals (product_id)",
+    ],
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS expiring_deals (product_id INTEGER PRIMARY KEY, vendor_id INTEGER, vendor_name VARCHAR, "
+        "name VARCHAR, price FLOAT, quantity INTEGER, expiry_date DATETIME, discount_percent FLOAT, effective_price FLOAT)",
+        f"INSERT INTO expiring_deals {DEALS_QUERY['sqlite']}",
+    ],
+}
+for _dialect, _statements in DEALS_DDL.items():
+    _statements.append("CREATE INDEX IF NOT EXISTS ix_expiring_deals_discount_id ON expiring_deals (discount_percent DESC, product_id)")
+    _statements.append("CREATE INDEX IF NOT EXISTS ix_expiring_deals_expiry_date ON expiring_deals (expiry_date)")
+    for _statement in _statements:
+        event.listen(ExpiryTracking.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(ExpiryTracking.__table__, "before_drop", DDL("DROP MATERIALIZED VIEW IF EXISTS expiring_deals").execute_if(dialect="postgresql"))
+event.listen(ExpiryTracking.__table__, "before_drop", DDL("DROP TABLE IF EXISTS expiring_deals").execute_if(dialect="sqlite"))
+
+# Read-only mapping of the deals feed (created by the DDL above, not by create_all)
+expiring_deals = Table(
+    "expiring_deals", MetaData(),
+    Column("product_id", Integer, primary_key=True),
+    Column("vendor_id", Integer),
+    Column("vendor_name", String),
+    Column("name", String),
+    Column("price", Float),
+    Column("quantity", Integer),
+    Column("expiry_date", DateTime),
+    Column("discount_percent", Float),
+    Column("effective_price", Float),
+)
+
 # Charity Model
 class Charity(Base):
     __tablename__ = "charities"
@@ -114,13 +333,15 @@ class CharityDonation(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     charity_id = Column(Integer, ForeignKey("charities.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)  # ✅ Moved to archived_product_id when archived
+    archived_product_id = Column(Integer, ForeignKey("products_archive.id"), index=True)
     quantity = Column(Integer, nullable=False)
     donation_date = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
     charity = relationship("Charity", back_populates="charity_donations")
     product = relationship("Product", back_populates="charity_donations")
+    archived_product = relationship("ProductArchive")
 
 # ====================== PAYMENTS & TRANSACTIONS ======================
 
@@ -167,6 +388,30 @@ class Notification(Base):
 
     user = relationship("User", back_populates="notifications")
 
+# Saved Search Model (A customer's standing query; matching new deals are sent as notifications)
+class SavedSearch(Base):
+    __tablename__ = "saved_searches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    keywords = Column(Text, nullable=True)  # Normalized words; all must appear in the product name/description
+    max_price = Column(Float, nullable=True)  # Ceiling on the discounted price
+    min_discount_percent = Column(Float, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    radius_km = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    matches = relationship("SavedSearchMatch", cascade="all, delete-orphan")
+
+# Saved Search Match Model (Products already notified for a saved search, so each deal is sent once)
+class SavedSearchMatch(Base):
+    __tablename__ = "saved_search_matches"
+
+    saved_search_id = Column(Integer, ForeignKey("saved_searches.id"), primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    matched_at = Column(DateTime, default=datetime.utcnow)
+
 # Review Model (Users reviewing vendors)
 class Review(Base):
     __tablename__ = "reviews"
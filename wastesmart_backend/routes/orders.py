@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
-from crud.orders import create_order, get_orders, get_order, update_order, delete_order
+from crud.orders import create_order, get_orders, get_order, update_order, delete_order, format_order
 from schemas import OrderCreate, OrderUpdate, OrderResponse
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
@@ -12,9 +12,9 @@ def add_order(order: OrderCreate, db: Session = Depends(get_db)):
     new_order = create_order(db, order)
     if new_order is None:
         raise HTTPException(status_code=400, detail="Invalid product ID")
-    if "error" in new_order:
+    if isinstance(new_order, dict):
         raise HTTPException(status_code=400, detail=new_order["error"])
-    return new_order
+    return format_order(new_order)
 
 @router.get("/", response_model=list[OrderResponse])
 def list_orders(db: Session = Depends(get_db)):
@@ -1,40 +1,187 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Literal
 from sqlalchemy.orm import Session
 from database import get_db
-from crud.products import create_product, get_products, get_product as fetch_product, update_product, delete_product
-from schemas import ProductCreate, ProductUpdate, ProductResponse
+from search_index import suggestions
+from scheduler import expiry_scheduler
+from crud.expiry_tracking import recompute_discounts
+from crud.deals import get_deals, refresh_deals
+from crud.archive import archive_products
+from crud.price_history import get_price_history, stream_price_history, DEFAULT_HISTORY_LIMIT, MAX_HISTORY_LIMIT
+from datetime import datetime
+from models import DEALS_HORIZON_DAYS, User
+from auth import get_current_admin
+from crud.products import create_product, get_products, get_product_cached, update_product, product_cache, delete_product, stream_products, get_product_changes, get_products_by_ids, search_products, fuzzy_search_products, get_product_facets, get_nearby_products, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_CHANGES_PAGE_SIZE, FUZZY_THRESHOLD, DEFAULT_FUZZY_LIMIT, MAX_FUZZY_LIMIT, DEFAULT_RADIUS_KM, MAX_RADIUS_KM
+from http_cache import is_not_modified, set_validators, not_modified_response
+from serializers import ProductOut, NearbyProductOut, ProductPageOut, ProductBatchOut, ProductChangesOut, DealPageOut, PricePointOut, render
+from schemas import ProductCreate, ProductUpdate, ProductFilter, ProductSort, ProductBatchRequest, Suggestion, ProductFacets
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 # ✅ Create a new product
-@router.post("/", response_model=ProductResponse)
+@router.post("/", response_model=ProductOut)
 def add_product(product: ProductCreate, db: Session = Depends(get_db)):
-    return create_product(db, product)
+    return render(ProductOut, create_product(db, product))
 
-# ✅ List all products
-@router.get("/", response_model=list[ProductResponse])
-def list_products(db: Session = Depends(get_db)):
-    return get_products(db)
+# ✅ List products one page at a time (filtered and sorted in SQL, keyset pagination)
+@router.get("/", response_model=ProductPageOut, response_model_exclude_unset=True)
+def list_products(
+    filters: ProductFilter = Depends(),
+    sort: ProductSort = "expiry",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. id,name,price,expiry_date"),
+    db: Session = Depends(get_db),
+):
+    try:
+        page = get_products(db, filters=filters, sort=sort, limit=limit, cursor=cursor, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return render(ProductPageOut, page)
+
+# ✅ Deals near me: live products from vendors within a radius, nearest first, then soonest expiry
+@router.get("/nearby", response_model=list[NearbyProductOut])
+def nearby_products(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    filters: ProductFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    return render(list[NearbyProductOut], get_nearby_products(db, lat, lon, radius_km, filters=filters, limit=limit))
+
+# ✅ Counts per facet value for the browse filters, all from one grouped query
+@router.get("/facets", response_model=ProductFacets)
+def product_facets(filters: ProductFilter = Depends(), db: Session = Depends(get_db)):
+    return get_product_facets(db, filters)
+
+# ✅ Full-text search over name and description, ranked by relevance and how soon the product expires
+@router.get("/search", response_model=ProductPageOut)
+def search_product_catalog(
+    q: str = Query(..., min_length=1, max_length=200),
+    filters: ProductFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        page = search_products(db, q, filters=filters, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return render(ProductPageOut, page)
+
+# ✅ Typo-tolerant name search ("yoghurt", "brocolli"), best match first
+@router.get("/search/fuzzy", response_model=list[ProductOut])
+def fuzzy_search_catalog(
+    q: str = Query(..., min_length=1, max_length=100),
+    threshold: float = Query(FUZZY_THRESHOLD, gt=0, le=1),
+    limit: int = Query(DEFAULT_FUZZY_LIMIT, ge=1, le=MAX_FUZZY_LIMIT),
+    db: Session = Depends(get_db),
+):
+    return render(list[ProductOut], fuzzy_search_products(db, q, threshold=threshold, limit=limit))
+
+# ✅ Typeahead: product and vendor names served from this worker's in-memory prefix index (no DB query)
+@router.get("/suggest", response_model=list[Suggestion])
+def suggest_names(prefix: str = Query(..., min_length=1, max_length=80), limit: int = Query(10, ge=1, le=25)):
+    return suggestions.suggest(prefix, limit)
+
+# ✅ Look up several products at once (one IN query, no 404 for missing IDs)
+@router.post("/batch", response_model=ProductBatchOut)
+def batch_products(batch: ProductBatchRequest, db: Session = Depends(get_db)):
+    return render(ProductBatchOut, get_products_by_ids(db, batch.ids))
+
+# ✅ Stream the full catalog (NDJSON or a chunked JSON array) for partners and the search indexer
+@router.get("/export")
+def export_products(format: Literal["ndjson", "json"] = "ndjson", filters: ProductFilter = Depends()):
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(stream_products(format, filters), media_type=media_type)
+
+# ✅ Stream price history (NDJSON) for analytics, optionally for a time range
+@router.get("/price-history/export")
+def export_price_history(since: datetime | None = None, until: datetime | None = None):
+    return StreamingResponse(stream_price_history(since, until), media_type="application/x-ndjson")
+
+# ✅ Delta sync: products changed or deleted since a sync token
+@router.get("/changes", response_model=ProductChangesOut)
+def list_product_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_CHANGES_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    return render(ProductChangesOut, get_product_changes(db, since=since, limit=limit))
+
+# ✅ Recompute expiry discounts for the whole catalog (batch job; also run periodically, see DISCOUNT_RECOMPUTE_SECONDS)
+@router.post("/discounts/recompute")
+def recompute_expiry_discounts(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+    return recompute_discounts(db)
+
+# ✅ Products queued for their next discount-policy step in this worker
+@router.get("/discounts/schedule")
+def expiry_schedule_stats():
+    return expiry_scheduler.stats()
+
+# ✅ Deals page: deepest discounts expiring within `days`, read from the precomputed feed
+@router.get("/deals", response_model=DealPageOut)
+def list_deals(
+    days: int = Query(DEALS_HORIZON_DAYS, ge=0, le=DEALS_HORIZON_DAYS),
+    vendor_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        page = get_deals(db, days=days, vendor_id=vendor_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return render(DealPageOut, page)
+
+# ✅ Rebuild the deals feed now (the deals job also rebuilds it after product writes, and after discount recomputes)
+@router.post("/deals/refresh")
+def refresh_deals_feed(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+    return refresh_deals(db)
+
+# ✅ Move expired and sold-out products to the archive now (also runs on a schedule)
+@router.post("/archive")
+def archive_stale_products(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+    return archive_products(db)
+
+# ✅ Hit/miss counters of this worker's product read cache
+@router.get("/cache/stats")
+def product_cache_stats():
+    return product_cache.stats()
+
+# ✅ A product's list price and discount over time, newest first ("was $4.00, now $1.50")
+@router.get("/{product_id}/price-history", response_model=list[PricePointOut])
+def product_price_history(product_id: int, limit: int = Query(DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_LIMIT), db: Session = Depends(get_db)):
+    return render(list[PricePointOut], get_price_history(db, product_id, limit=limit))
 
 # ✅ Get a single product by ID with properly formatted expiry date
-@router.get("/{product_id}", response_model=ProductResponse)
-def get_single_product(product_id: int, db: Session = Depends(get_db)):
-    product = fetch_product(db, product_id)  # ✅ Fetch product from `crud.products`
+@router.get("/{product_id}", response_model=ProductOut)
+def get_single_product(product_id: int, request: Request, db: Session = Depends(get_db)):
+    cached = get_product_cached(db, product_id)  # ✅ Served from the read cache when warm
 
-    if not product:
+    if not cached:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    return product  # ✅ No need to manually format the response
+    # ✅ Answer conditional polls with 304 before sending the body
+    if is_not_modified(request, cached.etag, cached.last_modified):
+        return not_modified_response(cached.etag, cached.last_modified)
+
+    response = Response(content=cached.body, media_type="application/json")
+    set_validators(response, cached.etag, cached.last_modified)
+    return response
 
 
 
 # ✅ Update a product
-@router.put("/{product_id}", response_model=ProductResponse)
+@router.put("/{product_id}", response_model=ProductOut)
 def modify_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
     updated_product = update_product(db, product_id, product_update)
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return updated_product
+    return render(ProductOut, updated_product)
 
 # ✅ Delete a product
 @router.delete("/{product_id}")
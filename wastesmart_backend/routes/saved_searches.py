@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db
+from crud.saved_searches import create_saved_search, get_saved_searches, delete_saved_search
+from schemas import SavedSearchCreate, SavedSearchResponse
+
+router = APIRouter(prefix="/saved-searches", tags=["Saved Searches"])
+
+@router.post("/", response_model=SavedSearchResponse)
+def save_search(saved_search: SavedSearchCreate, db: Session = Depends(get_db)):
+    """Saves a search; matching new deals are sent to the user as notifications."""
+    return create_saved_search(db, saved_search)
+
+@router.get("/{user_id}", response_model=list[SavedSearchResponse])
+def list_saved_searches(user_id: int, db: Session = Depends(get_db)):
+    """Fetch all saved searches of a user."""
+    return get_saved_searches(db, user_id)
+
+@router.delete("/{saved_search_id}")
+def remove_saved_search(saved_search_id: int, db: Session = Depends(get_db)):
+    """Delete a saved search."""
+    saved_search = delete_saved_search(db, saved_search_id)
+    if not saved_search:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return {"message": "Saved search deleted successfully"}
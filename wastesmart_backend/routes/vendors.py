@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from database import get_db
-from crud.vendors import create_vendor, get_vendors, get_vendor, update_vendor, delete_vendor, get_vendor_by_email
-from schemas import VendorCreate, VendorUpdate, VendorResponse, VendorLogin
+from crud.vendors import create_vendor, get_vendors, get_vendor, update_vendor, delete_vendor, get_vendor_by_email, get_vendor_storefront, format_vendor
+from schemas import VendorCreate, VendorUpdate, VendorResponse, VendorPartial, VendorLogin, BulkPriceUpdate, BulkPriceResult
 from models import Product, Vendor
-from typing import List
-from schemas import ProductResponse
+from crud.products import get_vendor_products_validators, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from crud.archive import get_vendor_history
+from crud.pricing import update_vendor_prices
+from http_cache import make_etag, is_not_modified, set_validators, not_modified_response
+from serializers import ProductOut, StorefrontOut, VendorHistoryOut, render
 from auth import authenticate_user, get_current_user, create_access_token 
 from passlib.context import CryptContext
 
@@ -16,60 +20,47 @@ router = APIRouter(prefix="/vendors", tags=["Vendors"])
 @router.post("/", response_model=VendorResponse)
 def add_vendor(vendor: VendorCreate, db: Session = Depends(get_db)):
     """Creates a new vendor."""
-    return create_vendor(db, vendor)
-
-@router.get("/vendors/", response_model=list[VendorResponse])
-def list_vendors(db: Session = Depends(get_db)):
-    """Fetch all vendors."""
-    vendors = db.query(Vendor).all()
-
-    return [
-        {
-            "id": v.id,
-            "name": v.name,
-            "contact": v.contact or "N/A",
-            "location": v.location or "N/A",  # ✅ Fix None value for `location`
-            "created_at": v.created_at.isoformat() if v.created_at else "N/A",  # ✅ Convert datetime to string
-            "email": v.email,
-            "address": v.address or "N/A",
-            "business_category": v.business_category or "N/A",
-            "business_description": v.business_description or "N/A",
-            "business_license": v.business_license or "N/A",
-            "logo_url": v.logo_url or "",
-            "operating_hours": v.operating_hours or {},
-            "discount_policy": v.discount_policy or "N/A",
-            "accepts_donations": v.accepts_donations if v.accepts_donations is not None else False,
-            "bank_account": v.bank_account or "N/A",
-            "upi_id": v.upi_id or "N/A",
-        }
-        for v in vendors
-    ]
+    try:
+        return create_vendor(db, vendor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid operating_hours: {e}")
+
+@router.get("/vendors/", response_model=list[VendorResponse] | list[VendorPartial], response_model_exclude_unset=True)
+def list_vendors(
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. id,name,location,logo_url"),
+    open_now: bool = False,
+    open_at: datetime | None = Query(None, description="Only vendors open at this time, e.g. 2025-03-01T18:30"),
+    db: Session = Depends(get_db),
+):
+    """Fetch all vendors (optionally only those open now / at a given time)."""
+    if open_now and open_at is None:
+        open_at = datetime.now()
+    try:
+        return get_vendors(db, fields=fields, open_at=open_at)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{vendor_id}", response_model=VendorResponse)
-def get_single_vendor(vendor_id: int, db: Session = Depends(get_db)):
+def get_single_vendor(vendor_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Fetch a single vendor by ID."""
     vendor = get_vendor(db, vendor_id)
     if not vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
 
-    return {
-        "id": vendor.id,
-        "name": vendor.name,
-        "contact": vendor.contact or "N/A",
-        "location": vendor.location or "N/A",
-        "created_at": vendor.created_at.isoformat() if vendor.created_at else "N/A",
-        "email": vendor.email,
-        "address": vendor.address or "N/A",
-        "business_category": vendor.business_category or "N/A",
-        "business_description": vendor.business_description or "N/A",
-        "business_license": vendor.business_license or "N/A",
-        "logo_url": vendor.logo_url or "",
-        "operating_hours": vendor.operating_hours or {},
-        "discount_policy": vendor.discount_policy or "N/A",
-        "accepts_donations": vendor.accepts_donations if vendor.accepts_donations is not None else False,
-        "bank_account": vendor.bank_account or "N/A",
-        "upi_id": vendor.upi_id or "N/A",
-    }
+    etag = make_etag("vendor", vendor.id, vendor.version_id)
+    if is_not_modified(request, etag, vendor.updated_at):
+        return not_modified_response(etag, vendor.updated_at)
+
+    set_validators(response, etag, vendor.updated_at)
+    return format_vendor(vendor)
+
+@router.get("/{vendor_id}/storefront", response_model=StorefrontOut)
+def get_storefront(vendor_id: int, db: Session = Depends(get_db)):
+    """Fetch a vendor's profile, live products and rating summary in a single request."""
+    storefront = get_vendor_storefront(db, vendor_id)
+    if not storefront:
+        raise HTTPException(status_code=404, detail="Vendor not found")
+    return render(StorefrontOut, storefront)
 
 @router.put("/{vendor_id}", response_model=VendorResponse)
 def modify_vendor(vendor_id: int, vendor_update: VendorUpdate, db: Session = Depends(get_db), current_vendor: Vendor = Depends(get_current_user)):
@@ -77,7 +68,10 @@ def modify_vendor(vendor_id: int, vendor_update: VendorUpdate, db: Session = Dep
     if current_vendor.id != vendor_id:
         raise HTTPException(status_code=403, detail="You can only update your own profile")
     
-    updated_vendor = update_vendor(db, vendor_id, vendor_update)
+    try:
+        updated_vendor = update_vendor(db, vendor_id, vendor_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid operating_hours: {e}")
     if not updated_vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
     return updated_vendor
@@ -93,29 +87,41 @@ def remove_vendor(vendor_id: int, db: Session = Depends(get_db), current_vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
     return {"message": "Vendor deleted successfully"}
 
-@router.get("/{vendor_id}/products", response_model=List[ProductResponse])
-def get_products_by_vendor(vendor_id: int, db: Session = Depends(get_db)):
+@router.get("/{vendor_id}/products", response_model=list[ProductOut])
+def get_products_by_vendor(vendor_id: int, request: Request, db: Session = Depends(get_db)):
     """Fetch all products related to a particular vendor."""
-    
-    products = db.query(Product).filter(Product.vendor_id == vendor_id).all()
-    
-    if not products:
+
+    # ✅ Validate against a cheap aggregate before loading the list
+    count, last_modified, version_sum = get_vendor_products_validators(db, vendor_id)
+    if not count:
         raise HTTPException(status_code=404, detail="No products found for this vendor")
 
-    return [
-        {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description or "No description available",
-            "price": product.price,
-            "expiry_date": product.expiry_date.isoformat() if product.expiry_date else "N/A",
-            "charity_eligible": product.charity_eligible if product.charity_eligible is not None else False,
-            "quantity": product.quantity,
-            "created_at": product.created_at.isoformat() if product.created_at else "N/A",
-            "vendor_id": product.vendor_id
-        }
-        for product in products
-    ]
+    # ✅ ETag only: max(updated_at) doesn't move when a product is deleted, so no Last-Modified on the list
+    etag = make_etag("vendor-products", vendor_id, count, last_modified, version_sum)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    products = db.query(Product).filter(Product.vendor_id == vendor_id).all()
+    response = render(list[ProductOut], products)
+    set_validators(response, etag)
+    return response
+
+@router.patch("/{vendor_id}/products/prices", response_model=BulkPriceResult)
+def reprice_vendor_products(vendor_id: int, price_update: BulkPriceUpdate, db: Session = Depends(get_db), current_vendor: Vendor = Depends(get_current_user)):
+    """Reprice many products at once (e.g. closing-time markdowns) in a single UPDATE."""
+    if current_vendor.id != vendor_id:
+        raise HTTPException(status_code=403, detail="You can only update your own products")
+    return update_vendor_prices(db, vendor_id, price_update)
+
+@router.get("/{vendor_id}/history", response_model=VendorHistoryOut)
+def get_vendor_product_history(
+    vendor_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: int | None = None,
+    db: Session = Depends(get_db),
+):
+    """Fetch a vendor's live and archived products, newest first."""
+    return render(VendorHistoryOut, get_vendor_history(db, vendor_id, limit=limit, before=before))
 
 @router.post("/login")
 def vendor_login(vendor: VendorLogin, db: Session = Depends(get_db)):
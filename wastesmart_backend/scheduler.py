@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEED_WINDOW = timedelta(hours=6)
+TRANSITION_BATCH_SIZE = 1000
+RETRY_DELAY = timedelta(minutes=1)
+
+def next_threshold(expiry_date: datetime, now: datetime, thresholds_hours) -> datetime | None:
+    """The first hours-to-expiry boundary after `now`, or None if all have passed."""
+    upcoming = [expiry_date - timedelta(hours=h) for h in thresholds_hours]
+    upcoming = [due for due in upcoming if due > now]
+    return min(upcoming, default=None)
+
+class ExpiryScheduler:
+    """Min-heap of the next expiry threshold per product; wakes only when the earliest one is due.
+
+    Thresholds are the step boundaries of the discount policies: the default policy's, or the product's
+    vendor's own. Only thresholds up to `seeded_until` live in the heap. Every SEED_WINDOW the scheduler
+    reloads the thresholds and reads the products whose thresholds fall in the next window from the
+    expiry_date index (one range per distinct threshold), so far-off products cost nothing until they
+    approach one. Popped products are re-queued for their next threshold if it is inside the window.
+    """
+
+    def __init__(self):
+        self._heap = []  # (due, product_id)
+        self._due = {}  # product_id -> due of its live heap entry; older entries are skipped when popped
+        self._default_hours = ()
+        self._vendor_hours = {}  # vendor_id -> thresholds, only for vendors whose policy differs from the default
+        self._reload = False
+        self._seeded_until = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def _thresholds(self, vendor_id: int | None):
+        return self._vendor_hours.get(vendor_id, self._default_hours)
+
+    def _all_thresholds(self):
+        return sorted(set(self._default_hours).union(*self._vendor_hours.values()), reverse=True)
+
+    def schedule(self, product_id: int, expiry_date: datetime | None, vendor_id: int | None = None, now: datetime | None = None):
+        """(Re)queues a product after its expiry date was set or changed."""
+        with self._cond:
+            if self._seeded_until is None:
+                return  # ✅ Not running; the initial seed will read it from the table
+            due = next_threshold(expiry_date, now or datetime.now(), self._thresholds(vendor_id)) if expiry_date else None
+            if due is None or due > self._seeded_until:
+                self._due.pop(product_id, None)  # ✅ A later seed pass picks it up from the index
+                return
+            if self._due.get(product_id) == due:
+                return  # ✅ Already queued for it (e.g. replayed by the cross-worker resync)
+            self._due[product_id] = due
+            heapq.heappush(self._heap, (due, product_id))
+            if self._heap[0] == (due, product_id):
+                self._cond.notify()  # ✅ New earliest deadline: shorten the sleep
+
+    def unschedule(self, product_id: int):
+        with self._cond:
+            self._due.pop(product_id, None)
+
+    def reload_thresholds(self):
+        """Re-reads the policies' thresholds and re-seeds the current window (after a vendor changed their policy)."""
+        with self._cond:
+            if self._seeded_until is not None:
+                self._reload = True
+                self._cond.notify()
+
+    def _seed(self, rows, now: datetime):
+        """Queues (product_id, expiry_date, vendor_id) rows whose next threshold falls before `seeded_until`."""
+        for product_id, expiry_date, vendor_id in rows:
+            due = next_threshold(expiry_date, now, self._thresholds(vendor_id))
+            if due is not None and due <= self._seeded_until and self._due.get(product_id) != due:
+                self._due[product_id] = due
+                heapq.heappush(self._heap, (due, product_id))
+
+    def _pop_due(self, now: datetime) -> list[int]:
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now and len(due_ids) < TRANSITION_BATCH_SIZE:
+            due, product_id = heapq.heappop(self._heap)
+            if self._due.get(product_id) == due:
+                del self._due[product_id]
+                due_ids.append(product_id)
+        return due_ids
+
+    def start(self, session_factory, load_thresholds, load_expiring, apply_transitions):
+        """Seeds the heap and starts the worker thread.
+
+        `load_thresholds(db)` returns (default thresholds, {vendor_id: thresholds}) in hours to expiry;
+        `load_expiring(db, start, end)` returns (product_id, expiry_date, vendor_id) for expiry dates in (start, end];
+        `apply_transitions(db, product_ids, now)` reprices them and returns {product_id: (expiry_date, vendor_id)}.
+        """
+        now = datetime.now()
+        db = session_factory()
+        try:
+            default_hours, vendor_hours = load_thresholds(db)
+            with self._cond:
+                self._default_hours, self._vendor_hours = default_hours, vendor_hours
+                self._seeded_until = now + SEED_WINDOW
+                horizon = timedelta(hours=max(self._all_thresholds(), default=0))
+                self._seed(load_expiring(db, now, self._seeded_until + horizon), now)
+        finally:
+            db.close()
+        self._thread = threading.Thread(
+            target=self._run, args=(session_factory, load_thresholds, load_expiring, apply_transitions),
+            name="expiry-scheduler", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self, session_factory, load_thresholds, load_expiring, apply_transitions):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = datetime.now()
+                    wake_at = min(self._heap[0][0], self._seeded_until) if self._heap else self._seeded_until
+                    if wake_at <= now or self._reload:
+                        break
+                    self._cond.wait((wake_at - now).total_seconds())
+                if self._stopping:
+                    return
+                seed_from = seed_to = None
+                if self._seeded_until <= now:
+                    # ✅ Next slice of the expiry_date index: products reaching a threshold in the new window
+                    seed_from, seed_to = self._seeded_until, now + SEED_WINDOW
+                    self._seeded_until = seed_to
+                elif self._reload:
+                    seed_from, seed_to = now, self._seeded_until  # ✅ Thresholds moved: re-read the current window
+                self._reload = False
+                due_ids = self._pop_due(now)
+
+            db = session_factory()
+            try:
+                if seed_from is not None:
+                    default_hours, vendor_hours = load_thresholds(db)  # ✅ Picks up policy changes from any worker
+                    with self._cond:
+                        self._default_hours, self._vendor_hours = default_hours, vendor_hours
+                        thresholds = self._all_thresholds()
+                    for hours in thresholds:  # ✅ One index range per distinct threshold
+                        rows = load_expiring(db, seed_from + timedelta(hours=hours), seed_to + timedelta(hours=hours))
+                        with self._cond:
+                            self._seed(rows, now)
+                if due_ids:
+                    transitioned = apply_transitions(db, due_ids, now)
+                    for product_id, (expiry_date, vendor_id) in transitioned.items():
+                        self.schedule(product_id, expiry_date, vendor_id, now)
+            except Exception:
+                db.rollback()
+                logger.exception("Expiry transitions failed for %d products", len(due_ids))
+                self._retry(due_ids, now + RETRY_DELAY)
+            finally:
+                db.close()
+
+    def _retry(self, product_ids: list[int], due: datetime):
+        with self._cond:
+            for product_id in product_ids:
+                if product_id not in self._due:  # ✅ Unless a write re-queued it meanwhile
+                    self._due[product_id] = due
+                    heapq.heappush(self._heap, (due, product_id))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._due),
+                "next_due": min(self._due.values()).isoformat() if self._due else None,
+                "seeded_until": self._seeded_until.isoformat() if self._seeded_until else None,
+            }
+
+expiry_scheduler = ExpiryScheduler()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, field_validator, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, model_validator, Field, AfterValidator, ValidationError
+from typing import Annotated, Optional, Literal
 from datetime import datetime
 
 # Schema for token data (used to extract user details from JWT)
@@ -42,6 +42,7 @@ class ProductCreate(BaseModel):
     quantity: int
     expiry_date: str  # YYYY-MM-DD format
     vendor_id: int
+    category: Optional[str] = None  # ✅ e.g. dairy, bakery (vendor discount policies can override by category)
     
 
 class ProductUpdate(BaseModel): 
@@ -50,27 +51,45 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     quantity: Optional[int] = None
     expiry_date: Optional[str] = None
-
-class ProductResponse(ProductCreate):
-    id: int
-    created_at: str  # ✅ Ensure this is a string
-    vendor_id: int
-
-    class Config:
-        from_attributes = True  # ✅ Required for FastAPI with Pydantic V2
-
-    @field_validator("created_at", "expiry_date", mode="before")
-    def convert_datetime_to_str(cls, value):
-        """Converts datetime to string format if needed."""
-        if isinstance(value, datetime):
-            return value.isoformat()  # Converts to 'YYYY-MM-DDTHH:MM:SS'
-        return value  # If already a string, return as is
+    category: Optional[str] = None
+
+# Query filters for the product catalog (applied in SQL)
+class ProductFilter(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    vendor_id: Optional[int] = None
+    expires_within_days: Optional[int] = None  # ✅ Only products expiring between now and now + N days
+    charity_eligible: Optional[bool] = None
+    in_stock: Optional[bool] = None
+    business_category: Optional[str] = None  # ✅ Vendor's business category
+    open_now: Optional[bool] = None  # ✅ Only products whose vendor is open right now
+    open_at: Optional[datetime] = None  # ✅ ...or open at this time (vendor-local)
+
+# Supported catalog orderings: soonest expiry, cheapest, newest
+ProductSort = Literal["expiry", "price", "newest"]
+
+# Schemas for batch product lookup by ID
+class ProductBatchRequest(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=200)
+
+# Schema for a typeahead suggestion
+class Suggestion(BaseModel):
+    text: str
+    kind: Literal["product", "vendor"]
+
+# Product counts per facet value for the browse filters
+class ProductFacets(BaseModel):
+    total: int
+    business_category: dict[str, int]
+    expiry: dict[str, int]  # ✅ expired / today / 3_days / week / later
+    price_band: dict[str, int]
+    charity_eligible: dict[str, int]  # ✅ "true" / "false"
 
 # Schema for order creation
 class OrderCreate(BaseModel):
     user_id: int
     product_id: int
-    quantity: int
+    quantity: int = Field(..., gt=0)  # ✅ A negative quantity would add stock
 
 class OrderUpdate(BaseModel):
     status: Optional[str] = None  # 'pending', 'completed', 'canceled'
@@ -110,6 +129,42 @@ class PaymentResponse(BaseModel):
     class Config:
         from_attributes = True  # ✅ Ensures automatic conversion for ORM models    
 
+# Schemas for a vendor's structured discount policy (stored as JSON in Vendor.discount_policy)
+class DiscountStep(BaseModel):
+    days: float = Field(..., ge=0)  # ✅ Applies when at most this many days are left
+    percent: float = Field(..., ge=0, le=100)
+
+class DiscountCurve(BaseModel):
+    curve: Literal["step", "linear"] = "step"
+    steps: Optional[list[DiscountStep]] = None  # ✅ step: percent off by days to expiry
+    start_days: Optional[float] = Field(None, gt=0)  # ✅ linear: 0% this many days out...
+    max_percent: Optional[float] = Field(None, ge=0, le=100)  # ✅ ...rising to this on the expiry day
+
+    @model_validator(mode="after")
+    def check_curve(self):
+        """A step curve needs steps; a linear curve needs start_days and max_percent."""
+        if self.curve == "step" and not self.steps:
+            raise ValueError("A step curve needs at least one step")
+        if self.curve == "linear" and (self.start_days is None or self.max_percent is None):
+            raise ValueError("A linear curve needs start_days and max_percent")
+        return self
+
+class DiscountPolicySpec(DiscountCurve):
+    cap_percent: Optional[float] = Field(None, ge=0, le=100)  # ✅ Never discount more than this
+    floor_price: Optional[float] = Field(None, ge=0)  # ✅ Never sell below this price
+    category_overrides: dict[str, DiscountCurve] = {}  # ✅ Product category -> its own curve
+
+def _check_policy_text(policy):
+    """Free text stays free text, but text that looks like JSON must be a valid structured policy."""
+    if isinstance(policy, str) and policy.lstrip().startswith("{"):
+        try:
+            return DiscountPolicySpec.model_validate_json(policy)
+        except ValidationError:
+            raise ValueError("discount_policy looks like JSON but is not a valid policy; send it as an object")
+    return policy
+
+DiscountPolicyInput = Annotated[DiscountPolicySpec | str, AfterValidator(_check_policy_text)]
+
 # Schema for vendor creation
 
 class VendorLogin(BaseModel):
@@ -128,10 +183,12 @@ class VendorCreate(BaseModel):
     business_license: Optional[str] = None
     logo_url: Optional[str] = None
     operating_hours: Optional[dict[str, str]] = None  # ✅ JSON format
-    discount_policy: Optional[str] = None
+    discount_policy: Optional[DiscountPolicyInput] = None  # ✅ Structured policy (legacy free text still accepted)
     accepts_donations: Optional[bool] = False
     bank_account: Optional[str] = None
     upi_id: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # ✅ Geo position for "deals near me"
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class VendorUpdate(BaseModel):
@@ -146,11 +203,40 @@ class VendorUpdate(BaseModel):
     business_license: Optional[str] = None
     logo_url: Optional[str] = None
     operating_hours: Optional[dict[str, str]] = None
-    discount_policy: Optional[str] = None
+    discount_policy: Optional[DiscountPolicyInput] = None
     accepts_donations: Optional[bool] = None
     bank_account: Optional[str] = None
     upi_id: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # ✅ Geo position for "deals near me"
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
 
+# Bulk repricing of a vendor's products: explicit prices, or one percentage applied to many products
+class PriceChange(BaseModel):
+    product_id: int
+    price: float = Field(..., gt=0)
+
+class BulkPriceUpdate(BaseModel):
+    prices: Optional[list[PriceChange]] = Field(None, min_length=1, max_length=1000)
+    percent: Optional[float] = Field(None, gt=-100, le=1000)  # ✅ e.g. -30 for 30% off
+    product_ids: Optional[list[int]] = Field(None, min_length=1, max_length=1000)  # ✅ Scope of `percent`; default all
+
+    @model_validator(mode="after")
+    def check_rule(self):
+        if (self.prices is None) == (self.percent is None):
+            raise ValueError("Send either `prices` or `percent`")
+        if self.prices is not None and self.product_ids is not None:
+            raise ValueError("`product_ids` only applies to `percent`")
+        return self
+
+class RepricedProduct(BaseModel):
+    id: int
+    price: float
+    version_id: int
+
+class BulkPriceResult(BaseModel):
+    updated: list[RepricedProduct]
+    missing: list[int]  # ✅ Requested IDs that don't exist or belong to another vendor
 
 class VendorResponse(BaseModel):
     id: int
@@ -165,10 +251,12 @@ class VendorResponse(BaseModel):
     business_license: Optional[str] = None
     logo_url: Optional[str] = None
     operating_hours: Optional[dict] = None
-    discount_policy: Optional[str] = None
+    discount_policy: Optional[dict | str] = None  # ✅ dict for structured policies
     accepts_donations: Optional[bool] = None
     bank_account: Optional[str] = None
     upi_id: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         orm_mode = True
@@ -181,6 +269,27 @@ class VendorResponse(BaseModel):
         result = super().dict(*args, **kwargs)
         result["created_at"] = self.format_datetime(result["created_at"])
         return result
+# Schema for a vendor with only the requested `fields` (sparse fieldsets)
+class VendorPartial(BaseModel):
+    id: int
+    name: Optional[str] = None
+    contact: Optional[str] = None
+    location: Optional[str] = None
+    created_at: Optional[str] = None
+    email: Optional[str] = None
+    address: Optional[str] = None
+    business_category: Optional[str] = None
+    business_description: Optional[str] = None
+    business_license: Optional[str] = None
+    logo_url: Optional[str] = None
+    operating_hours: Optional[dict] = None
+    discount_policy: Optional[dict | str] = None  # ✅ dict for structured policies
+    accepts_donations: Optional[bool] = None
+    bank_account: Optional[str] = None
+    upi_id: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
 # Schema for charity creation
 class CharityCreate(BaseModel):
     name: str
@@ -222,6 +331,42 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True  # ✅ Ensures automatic conversion for ORM models
 
+# Schema for saved searches ("tell me when discounted baby formula appears near me")
+class SavedSearchCreate(BaseModel):
+    user_id: int
+    query: Optional[str] = Field(None, max_length=200)  # ✅ Every word must appear in the product
+    max_price: Optional[float] = Field(None, ge=0)  # ✅ Compared with the discounted price
+    min_discount_percent: Optional[float] = Field(None, ge=0, le=100)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_km: Optional[float] = Field(None, gt=0, le=50)
+
+    @model_validator(mode="after")
+    def check_predicates(self):
+        """Location needs all three of latitude/longitude/radius_km, and the search needs at least one predicate."""
+        location = (self.latitude, self.longitude, self.radius_km)
+        if any(v is not None for v in location) and any(v is None for v in location):
+            raise ValueError("latitude, longitude and radius_km must be given together")
+        if not (self.query or "").strip() and all(
+            v is None for v in (self.max_price, self.min_discount_percent, self.radius_km)
+        ):
+            raise ValueError("A saved search needs a query, a price, a discount or a location")
+        return self
+
+class SavedSearchResponse(BaseModel):
+    id: int
+    user_id: int
+    keywords: Optional[str] = None
+    max_price: Optional[float] = None
+    min_discount_percent: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Schema for donation creation
 # ✅ Monetary Donation Schema
 class DonationCreate(BaseModel):
@@ -0,0 +1,413 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict, namedtuple
+import heapq
+import math
+import os
+import re
+import threading
+
+def normalize(text: str) -> str:
+    """Lower-cases and collapses whitespace so lookups ignore case and spacing."""
+    return " ".join(text.lower().split())
+
+class PrefixIndex:
+    """In-process typeahead index: a sorted array of name suffixes that start at a word boundary.
+
+    Each distinct (kind, name) is stored once with a reference count, so a hundred products called
+    "Milk" cost one entry. The array is capped at `max_keys`; names that would exceed it are dropped
+    (and counted) rather than growing without bound.
+    """
+
+    def __init__(self, max_keys: int = 200_000, max_name_length: int = 80):
+        self.max_keys = max_keys
+        self.max_name_length = max_name_length
+        self._lock = threading.Lock()
+        self._keys = []    # sorted (suffix, kind, name)
+        self._names = {}   # (kind, name) -> [display text, reference count]
+        self._owners = {}  # (kind, id) -> name
+        self.dropped = 0
+
+    def _normalize(self, text: str) -> str:
+        return normalize(text or "")[:self.max_name_length]
+
+    @staticmethod
+    def _suffixes(name: str):
+        """Yields `name` from the start of each word, so "greek yogurt" is found by "yog" too."""
+        for i, char in enumerate(name):
+            if i == 0 or (name[i - 1] == " " and char != " "):
+                yield name[i:]
+
+    def _add(self, kind: str, item_id: int, text: str):
+        name = self._normalize(text)
+        if not name:
+            return
+        entry = self._names.get((kind, name))
+        if entry:
+            entry[1] += 1
+        else:
+            suffixes = list(self._suffixes(name))
+            if len(self._keys) + len(suffixes) > self.max_keys:
+                self.dropped += 1  # ✅ Full: keep the footprint bounded instead of indexing this name
+                return
+            for suffix in suffixes:
+                insort(self._keys, (suffix, kind, name))
+            self._names[(kind, name)] = [text.strip()[:self.max_name_length], 1]
+        self._owners[(kind, item_id)] = name
+
+    def _remove(self, kind: str, item_id: int):
+        name = self._owners.pop((kind, item_id), None)
+        if name is None:
+            return
+        entry = self._names[(kind, name)]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._names[(kind, name)]
+            for suffix in self._suffixes(name):
+                i = bisect_left(self._keys, (suffix, kind, name))
+                del self._keys[i]
+
+    def add(self, kind: str, item_id: int, text: str):
+        """Indexes (or re-indexes, after a rename) one product or vendor name."""
+        with self._lock:
+            self._remove(kind, item_id)
+            self._add(kind, item_id, text)
+
+    def remove(self, kind: str, item_id: int):
+        """Drops one product or vendor from the index."""
+        with self._lock:
+            self._remove(kind, item_id)
+
+    def rebuild(self, items):
+        """Replaces the whole index from an iterable of (kind, id, name), sorting once instead of inserting."""
+        names, owners = {}, {}
+        size = dropped = 0
+        for kind, item_id, text in items:
+            name = self._normalize(text)
+            if not name:
+                continue
+            entry = names.get((kind, name))
+            if entry:
+                entry[1] += 1
+            else:
+                suffix_count = sum(1 for _ in self._suffixes(name))
+                if size + suffix_count > self.max_keys:
+                    dropped += 1
+                    continue
+                size += suffix_count
+                names[(kind, name)] = [text.strip()[:self.max_name_length], 1]
+            owners[(kind, item_id)] = name
+        keys = sorted((suffix, kind, name) for kind, name in names for suffix in self._suffixes(name))
+
+        with self._lock:
+            self._keys, self._names, self._owners, self.dropped = keys, names, owners, dropped
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        """Returns up to `limit` distinct names with a word starting with `prefix`."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                suffix, kind, name = self._keys[i]
+                if not suffix.startswith(prefix):
+                    break
+                if (kind, name) not in seen:
+                    seen.add((kind, name))
+                    results.append({"text": self._names[(kind, name)][0], "kind": kind})
+                i += 1
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._keys), "names": len(self._names), "max_keys": self.max_keys, "dropped": self.dropped}
+
+def trigrams(text: str) -> set:
+    """Trigrams of each word, padded the way pg_trgm pads them ("  y", " yo", ..., "rt ")."""
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramIndex:
+    """In-process fuzzy name index (trigram -> ids), the SQLite/test stand-in for pg_trgm.
+
+    A name's score is the share of the query's trigrams it contains, close to pg_trgm's
+    word_similarity, so "yoghurt" still finds "Greek yogurt". Only filled once `rebuild` has run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)  # trigram -> ids
+        self._grams = {}                   # id -> frozenset of trigrams
+        self.ready = False
+
+    def _add(self, item_id: int, text: str):
+        grams = frozenset(trigrams(text or ""))
+        self._grams[item_id] = grams
+        for gram in grams:
+            self._postings[gram].add(item_id)
+
+    def _remove(self, item_id: int):
+        for gram in self._grams.pop(item_id, ()):
+            ids = self._postings[gram]
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[gram]
+
+    def add(self, item_id: int, text: str):
+        """Indexes (or re-indexes) one name; a no-op until the index has been built."""
+        with self._lock:
+            if self.ready:
+                self._remove(item_id)
+                self._add(item_id, text)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            if self.ready:
+                self._remove(item_id)
+
+    def rebuild(self, items):
+        """Replaces the index from an iterable of (id, name)."""
+        with self._lock:
+            self._postings, self._grams = defaultdict(set), {}
+            for item_id, text in items:
+                self._add(item_id, text)
+            self.ready = True
+
+    def search(self, q: str, threshold: float = 0.5) -> list:
+        """Returns (id, score) for every name scoring at least `threshold`, best first."""
+        query = trigrams(q)
+        if not query:
+            return []
+        # ✅ Prefix filtering: a name sharing >= `needed` trigrams must appear in one of the
+        # (len(query) - needed + 1) shortest posting lists, so the long lists are never scanned
+        needed = max(1, math.ceil(threshold * len(query)))
+        with self._lock:
+            lists = sorted((self._postings.get(gram, ()) for gram in query), key=len)
+            candidates = set().union(*lists[:len(query) - needed + 1])
+            scored = []
+            for item_id in candidates:
+                score = len(query & self._grams[item_id]) / len(query)
+                if score >= threshold:
+                    scored.append((score, -item_id))
+        return [(-neg_id, score) for score, neg_id in heapq.nlargest(len(scored), scored)]
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """(south, west, north, east) degrees enclosing the circle, within [-90, 90] x [-180, 180].
+
+    The longitude span widens towards the poles; a circle that reaches a pole or crosses the
+    antimeridian gets every longitude instead of a span that runs off the globe.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if south <= -90.0 or north >= 90.0:
+        return south, -180.0, north, 180.0
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    if lon - dlon < -180.0 or lon + dlon > 180.0:
+        return south, -180.0, north, 180.0
+    return south, lon - dlon, north, lon + dlon
+
+class GeoGridIndex:
+    """In-process spatial index of vendor positions bucketed into `cell_degrees` square grid cells.
+
+    A radius lookup only visits the cells overlapping the circle's bounding box. Stands in for the
+    Postgres GiST index when running on SQLite. Only filled once `rebuild` has run.
+    """
+
+    def __init__(self, cell_degrees: float = 0.05):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells = defaultdict(dict)  # (row, col) -> {id: (lat, lon)}
+        self._positions = {}             # id -> (row, col)
+        self.ready = False
+
+    def _cell(self, lat: float, lon: float):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _add(self, item_id: int, lat, lon):
+        if lat is None or lon is None:
+            return
+        cell = self._cell(lat, lon)
+        self._cells[cell][item_id] = (lat, lon)
+        self._positions[item_id] = cell
+
+    def _remove(self, item_id: int):
+        cell = self._positions.pop(item_id, None)
+        if cell is not None:
+            del self._cells[cell][item_id]
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def add(self, item_id: int, lat, lon):
+        """Indexes (or moves) one position; a no-op until the index has been built."""
+        with self._lock:
+            if self.ready:
+                self._remove(item_id)
+                self._add(item_id, lat, lon)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            if self.ready:
+                self._remove(item_id)
+
+    def rebuild(self, items):
+        """Replaces the index from an iterable of (id, lat, lon)."""
+        with self._lock:
+            self._cells, self._positions = defaultdict(dict), {}
+            for item_id, lat, lon in items:
+                self._add(item_id, lat, lon)
+            self.ready = True
+
+    def within(self, lat: float, lon: float, radius_km: float) -> list:
+        """Returns (id, distance_km) for every position within `radius_km`, nearest first."""
+        south, west, north, east = bounding_box(lat, lon, radius_km)
+        (row_min, col_min), (row_max, col_max) = self._cell(south, west), self._cell(north, east)
+        found = []
+        with self._lock:
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+                # ✅ Wide box (e.g. near a pole): walk the occupied cells instead of every cell in it
+                cells = [cell for (row, col), cell in self._cells.items() if row_min <= row <= row_max and col_min <= col <= col_max]
+            else:
+                cells = [self._cells.get((row, col), {}) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+            for cell in cells:
+                for item_id, (item_lat, item_lon) in cell.items():
+                    distance = haversine_km(lat, lon, item_lat, item_lon)
+                    if distance <= radius_km:
+                        found.append((item_id, distance))
+        return sorted(found, key=lambda item: (item[1], item[0]))
+
+def words(text: str) -> set:
+    """Lower-cased word tokens, as matched by saved-search keywords."""
+    return set(re.findall(r"[^\W_]+", (text or "").lower()))
+
+# A saved search's predicates, and the facts about one product they are checked against
+Subscription = namedtuple("Subscription", "id user_id keywords max_price min_discount latitude longitude radius_km")
+ProductFacts = namedtuple("ProductFacts", "words price discount latitude longitude")
+
+class SavedSearchIndex:
+    """In-process index of saved searches, so a new or re-priced product is only checked against candidates.
+
+    Each subscription is filed under exactly one access path, the most selective it has:
+    its longest keyword (every keyword must match, so that one must too); otherwise the coarse
+    grid cells its radius covers (or, past `max_cells` cells, e.g. near a pole, a single "wide" bucket
+    checked for every located product); otherwise its price ceiling, kept sorted so only ceilings at or
+    above the product's price are visited; otherwise its minimum discount, kept sorted so only
+    thresholds at or below the product's discount are visited. Candidates are then checked
+    against every predicate.
+    """
+
+    def __init__(self, cell_degrees: float = 0.25, max_cells: int = 64):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._lock = threading.Lock()
+        self._subscriptions = {}              # id -> Subscription
+        self._by_keyword = defaultdict(set)   # word -> ids
+        self._by_cell = defaultdict(set)      # (row, col) -> ids
+        self._wide = set()                    # radius ids covering more than `max_cells` cells
+        self._by_ceiling = []                 # sorted (max_price, id)
+        self._by_discount = []                # sorted (min_discount, id); neither filter sorts as 0 (matches all)
+        self.last_id = 0                      # ✅ Highest id loaded; newer rows are pulled in by `sync`
+
+    def _cell(self, lat: float, lon: float):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _cells(self, sub: Subscription):
+        """The grid cells `sub`'s radius covers, or None when there are more than `max_cells` of them."""
+        south, west, north, east = bounding_box(sub.latitude, sub.longitude, sub.radius_km)
+        (row_min, col_min), (row_max, col_max) = self._cell(south, west), self._cell(north, east)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > self.max_cells:
+            return None
+        return [(row, col) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+
+    def _band(self, sub: Subscription):
+        """The sorted list a keyword- and radius-less subscription lives in, and its entry there."""
+        if sub.max_price is not None:
+            return self._by_ceiling, (sub.max_price, sub.id)
+        return self._by_discount, (sub.min_discount or 0.0, sub.id)
+
+    def add(self, sub: Subscription):
+        with self._lock:
+            self._remove(sub.id)
+            self._subscriptions[sub.id] = sub
+            if sub.keywords:
+                self._by_keyword[max(sub.keywords, key=len)].add(sub.id)
+            elif sub.radius_km is not None:
+                cells = self._cells(sub)
+                if cells is None:
+                    self._wide.add(sub.id)
+                for cell in cells or ():
+                    self._by_cell[cell].add(sub.id)
+            else:
+                insort(*self._band(sub))
+            self.last_id = max(self.last_id, sub.id)
+
+    def _remove(self, sub_id: int):
+        sub = self._subscriptions.pop(sub_id, None)
+        if sub is None:
+            return
+        if sub.keywords:
+            self._by_keyword[max(sub.keywords, key=len)].discard(sub_id)
+        elif sub.radius_km is not None:
+            self._wide.discard(sub_id)
+            for cell in self._cells(sub) or ():
+                self._by_cell[cell].discard(sub_id)
+        else:
+            band, entry = self._band(sub)
+            i = bisect_left(band, entry)
+            if i < len(band) and band[i] == entry:
+                del band[i]
+
+    def remove(self, *sub_ids: int):
+        with self._lock:
+            for sub_id in sub_ids:
+                self._remove(sub_id)
+
+    @staticmethod
+    def _matches(sub: Subscription, product: ProductFacts) -> bool:
+        if not sub.keywords <= product.words:
+            return False
+        if sub.max_price is not None and product.price > sub.max_price:
+            return False
+        if sub.min_discount is not None and product.discount < sub.min_discount:
+            return False
+        if sub.radius_km is not None:
+            if product.latitude is None or product.longitude is None:
+                return False
+            if haversine_km(sub.latitude, sub.longitude, product.latitude, product.longitude) > sub.radius_km:
+                return False
+        return True
+
+    def match(self, product: ProductFacts) -> list:
+        """Returns the subscriptions `product` satisfies, touching only candidate subscriptions."""
+        with self._lock:
+            candidates = set()
+            for word in product.words:
+                candidates.update(self._by_keyword.get(word, ()))
+            if product.latitude is not None and product.longitude is not None:
+                candidates.update(self._by_cell.get(self._cell(product.latitude, product.longitude), ()))
+                candidates.update(self._wide)
+            start = bisect_left(self._by_ceiling, (product.price,))
+            candidates.update(sub_id for _, sub_id in self._by_ceiling[start:])
+            end = bisect_right(self._by_discount, (product.discount, math.inf))
+            candidates.update(sub_id for _, sub_id in self._by_discount[:end])
+            return [self._subscriptions[i] for i in candidates if self._matches(self._subscriptions[i], product)]
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+# ✅ One of each per worker; rebuilt from the database at startup (see main.lifespan)
+suggestions = PrefixIndex(max_keys=int(os.getenv("SUGGEST_MAX_KEYS", "200000")))
+fuzzy_names = TrigramIndex()
+vendor_locations = GeoGridIndex()
+saved_searches = SavedSearchIndex()
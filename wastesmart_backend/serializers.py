@@ -0,0 +1,112 @@
+from pydantic import BaseModel, ConfigDict, PlainSerializer, TypeAdapter, computed_field
+from fastapi import Response
+from typing import Annotated, Optional
+from datetime import datetime
+from functools import lru_cache
+from schemas import VendorResponse
+
+# ✅ Dates keep the formats the API has always returned
+ExpiryDate = Annotated[datetime, PlainSerializer(lambda v: v.strftime("%Y-%m-%d"), return_type=str)]
+Timestamp = Annotated[datetime, PlainSerializer(lambda v: v.strftime("%Y-%m-%d %H:%M:%S"), return_type=str)]
+
+# Product as read straight from an ORM row or a Core column select.
+# Columns that were not selected stay unset and are left out of the JSON (sparse fieldsets).
+class ProductOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    expiry_date: Optional[ExpiryDate] = None
+    created_at: Optional[Timestamp] = None
+    vendor_id: Optional[int] = None
+    charity_eligible: Optional[bool] = None
+    category: Optional[str] = None
+
+class ProductPageOut(BaseModel):
+    items: list[ProductOut]
+    next_cursor: Optional[str] = None
+
+class ProductBatchOut(BaseModel):
+    products: list[ProductOut]
+    missing: list[int]
+
+class ProductChangesOut(BaseModel):
+    changed: list[ProductOut]
+    deleted: list[int]
+    next_token: int
+    has_more: bool
+
+class NearbyProductOut(ProductOut):
+    distance_km: float
+
+# Live or archived product in a vendor's history
+class HistoryProductOut(ProductOut):
+    archived: bool
+
+class VendorHistoryOut(BaseModel):
+    items: list[HistoryProductOut]
+    next_before: Optional[int] = None
+
+# One price history entry ("was $4.00, now $1.50")
+class PricePointOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    product_id: Optional[int] = None
+    price: float
+    discount_percent: float
+    changed_at: Timestamp
+
+    @computed_field
+    def effective_price(self) -> float:
+        return round(self.price * (1 - self.discount_percent / 100), 2)
+
+# Row of the precomputed deals feed
+class DealOut(BaseModel):
+    product_id: int
+    vendor_id: Optional[int] = None
+    vendor_name: Optional[str] = None
+    name: str
+    price: float
+    quantity: int
+    expiry_date: ExpiryDate
+    discount_percent: float
+    effective_price: float
+
+class DealPageOut(BaseModel):
+    items: list[DealOut]
+    next_cursor: Optional[str] = None
+
+# Product with its current expiry discount (from the vendor's compiled policy at read time)
+class StorefrontProductOut(ProductOut):
+    discount_percent: float = 0.0
+
+    @computed_field
+    def discounted_price(self) -> float:
+        return round(self.price * (1 - self.discount_percent / 100), 2)
+
+class RatingSummaryOut(BaseModel):
+    average: Optional[float] = None  # ✅ None until the vendor has reviews
+    count: int
+
+# Vendor storefront: profile + live products + ratings in one response
+class StorefrontOut(BaseModel):
+    vendor: VendorResponse
+    products: list[StorefrontProductOut]
+    rating: RatingSummaryOut
+
+@lru_cache
+def get_adapter(tp) -> TypeAdapter:
+    """Builds (once per type) the compiled pydantic validator/serializer for `tp`."""
+    return TypeAdapter(tp)
+
+def dump_json(tp, value) -> bytes:
+    """Validates ORM rows / dicts into `tp` and encodes them to JSON bytes in one compiled pass."""
+    adapter = get_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True), exclude_unset=True)
+
+def render(tp, value) -> Response:
+    """Returns pre-encoded JSON so FastAPI skips its own response_model validation and encoding."""
+    return Response(content=dump_json(tp, value), media_type="application/json")
@@ -13,9 +13,19 @@ function Products() {
   const [expiryDays, setExpiryDays] = useState(30);
   const [inStock, setInStock] = useState(false);
   const [expiringSoon, setExpiringSoon] = useState(false);
-
-  useEffect(() => {
-    fetch(API_URL)
+  const [nextCursor, setNextCursor] = useState(null);
+  const [filtersActive, setFiltersActive] = useState(false);
+
+  // ✅ Fetch one page of products; filters are applied by the server
+  const loadProducts = (cursor = null, useFilters = filtersActive) => {
+    const params = new URLSearchParams();
+    if (useFilters) {
+      params.append("max_price", maxPrice);
+      if (expiringSoon) params.append("expires_within_days", expiryDays);
+      if (inStock) params.append("in_stock", "true");
+    }
+    if (cursor) params.append("cursor", cursor);
+    fetch(`${API_URL}?${params}`)
       .then((response) => {
         if (!response.ok) {
           throw new Error(`Error fetching products: ${response.status}`);
@@ -23,14 +33,20 @@ function Products() {
         return response.json();
       })
       .then((data) => {
-        setProducts(data);
-        setFilteredProducts(data);
+        const loaded = cursor ? [...products, ...data.items] : data.items;
+        setProducts(loaded);
+        setFilteredProducts(loaded);
+        setNextCursor(data.next_cursor);
         setLoading(false);
       })
       .catch((error) => {
         setError("Failed to load products");
         setLoading(false);
       });
+  };
+
+  useEffect(() => {
+    loadProducts();
   }, []);
 
   // ✅ Function to Calculate Expiry Status
@@ -50,24 +66,10 @@ function Products() {
     }
   };
 
-  // ✅ Apply Filters
+  // ✅ Apply Filters (re-query the first page with the new filters)
   const applyFilters = () => {
-    let filtered = products.filter((product) => product.price <= maxPrice);
-
-    if (expiringSoon) {
-      filtered = filtered.filter((product) => {
-        const today = new Date();
-        const expiry = new Date(product.expiry_date);
-        const diffDays = Math.ceil((expiry - today) / (1000 * 60 * 60 * 24));
-        return diffDays <= expiryDays;
-      });
-    }
-
-    if (inStock) {
-      filtered = filtered.filter((product) => product.quantity > 0);
-    }
-
-    setFilteredProducts(filtered);
+    setFiltersActive(true);
+    loadProducts(null, true);
   };
 
   if (loading)
@@ -199,6 +201,18 @@ function Products() {
             <p className="text-center text-lg text-gray-400">No products match the filters.</p>
           )}
         </div>
+
+        {/* ✅ Load More Button (shown while the server has more pages) */}
+        {nextCursor && (
+          <div className="text-center mt-8">
+            <button
+              onClick={() => loadProducts(nextCursor)}
+              className="bg-green-500 text-white px-6 py-2 rounded-lg hover:bg-green-600 transition"
+            >
+              Load More
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
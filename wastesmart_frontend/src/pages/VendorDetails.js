@@ -10,29 +10,19 @@ function VendorDetails() {
   const [cart, setCart] = useState([]);
 
   useEffect(() => {
-    fetch(`http://127.0.0.1:8000/vendors/vendors/${id}`)
+    // ✅ One request returns the vendor profile, live products and rating summary
+    fetch(`http://127.0.0.1:8000/vendors/vendors/${id}/storefront`)
       .then((response) => {
         if (!response.ok) throw new Error("Vendor not found.");
         return response.json();
       })
       .then((data) => {
-        setVendor(data);
+        setVendor(data.vendor);
+        setProducts(data.products);
       })
       .catch((err) => {
         console.error("Error fetching vendor:", err);
         setError("Vendor not found.");
-      });
-      
-    fetch(`http://127.0.0.1:8000/vendors/vendors/${id}/products`)
-      .then((response) => {
-        if (!response.ok) throw new Error("Failed to fetch products.");
-        return response.json();
-      })
-      .then((data) => {
-        setProducts(data);
-      })
-      .catch((err) => {
-        console.error("Error fetching products:", err);
       })
       .finally(() => setLoading(false));
   }, [id]);